@@ -12,8 +12,11 @@ that can be compiled using the FASM assembler. It handles:
 - Hardware function calls (UART, GPIO)
 """
 
+import bisect
 import os
-from typing import Dict, List, Optional, Set, Tuple
+from itertools import chain
+from typing import Dict, List, Optional, Set, TextIO, Tuple
+from peephole import MAX_IMMEDIATE3, peephole
 from parser import (
     Program, FunctionDef, Statement, Expression,
     Literal, Identifier, BinaryOp, UnaryOp, FunctionCall,
@@ -24,9 +27,98 @@ from parser import (
     AsmStmt, DoWhileStmt
 )
 
+# Number of leading function arguments passed in r:1, r:2, ... (the rest
+# go through the stack)
+ARGUMENT_REGISTERS = 5
+
+# Directory with ISA.inc and macros.inc, next to this module
+_INT_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "int_pack")
+
+# FASM register names (ISA.inc uses format r:0, r:1, etc. with colon),
+# built once instead of formatting a new string for every operand
+_REG_NAMES = tuple(f"r:{i}" for i in range(32))
+
+# mov takes a 20-bit immediate; wider constants are built in several steps
+_MAX_IMMEDIATE = (1 << 20) - 1
+# Low bits or-ed in after the shifted upper part of a wide constant
+_WIDE_LOW_BITS = 12
+
+# Compile-time evaluation of operators on constant operands. Uses the same
+# 32-bit unsigned semantics as the generated code (x / 0 and x % 0 give 0).
+_MASK32 = 0xFFFFFFFF
+_CONSTANT_BINARY_OPS = {
+    '+': lambda l, r: (l + r) & _MASK32,
+    '-': lambda l, r: (l - r) & _MASK32,
+    '*': lambda l, r: (l * r) & _MASK32,
+    '/': lambda l, r: l // r if r != 0 else 0,
+    '%': lambda l, r: l % r if r != 0 else 0,
+    '&': lambda l, r: l & r,
+    '|': lambda l, r: l | r,
+    '^': lambda l, r: l ^ r,
+    '<<': lambda l, r: (l << (r & 0x1F)) & _MASK32,
+    '>>': lambda l, r: l >> (r & 0x1F),
+    '==': lambda l, r: 1 if l == r else 0,
+    '!=': lambda l, r: 1 if l != r else 0,
+    '<': lambda l, r: 1 if l < r else 0,
+    '<=': lambda l, r: 1 if l <= r else 0,
+    '>': lambda l, r: 1 if l > r else 0,
+    '>=': lambda l, r: 1 if l >= r else 0,
+    '&&': lambda l, r: 1 if (l != 0 and r != 0) else 0,
+    '||': lambda l, r: 1 if (l != 0 or r != 0) else 0,
+}
+_CONSTANT_UNARY_OPS = {
+    '-': lambda v: (-v) & _MASK32,
+    '~': lambda v: (~v) & _MASK32,
+    '!': lambda v: 1 if v == 0 else 0,
+}
+# Registers holding frequently used constants for a whole function (taken
+# from the top of the variable pool; the same register for a value in every
+# function, so a callee never leaves a different constant behind)
+_CONSTANT_REGISTERS = {_MASK32: 28, 0: 27, 1: 26}
+
+# Most initializer values written on one 'dd' line of the data section
+_DATA_WORDS_PER_LINE = 16
+
+# Operators that are a single three-operand instruction
+_ALU_INSTRUCTIONS = {
+    '+': 'add',
+    '-': 'sub',
+    '&': 'and',
+    '|': 'or',
+    '^': 'xor',
+    '<<': 'shl',
+    '>>': 'shr',
+}
+
+# Comparison operator -> (compare instruction, 0/-1 to 0/1 conversion)
+_COMPARISON_OPS = {
+    '==': ('cmpe', 'and'),
+    '!=': ('cmpe', 'add'),
+    '<': ('cmpb', 'and'),
+    '>': ('cmpa', 'and'),
+    '<=': ('cmpa', 'add'),
+    '>=': ('cmpb', 'add'),
+}
+
+# Comparison operator -> the one that is true exactly when it is false
+_NEGATED_COMPARISONS = {
+    '==': '!=', '!=': '==',
+    '<': '>=', '>=': '<',
+    '>': '<=', '<=': '>',
+}
+
+# Operators whose code reads both operands in its first instruction and
+# never again, so the result register may be one of the operand registers
+_OPERANDS_READ_FIRST = frozenset(_ALU_INSTRUCTIONS) | frozenset(_COMPARISON_OPS) | {'||'}
+
+# Operators whose operands may be swapped when looking for identities
+_COMMUTATIVE_OPS = frozenset({'+', '*', '&', '|', '^'})
+
 
 class LoopContext:
     """Context for a loop (while, for, or do_while) to support break/continue."""
+    __slots__ = ('start_label', 'end_label', 'loop_type', 'increment_label', 'condition_label')
+    
     def __init__(self, start_label: str, end_label: str, loop_type: str, increment_label: Optional[str] = None, condition_label: Optional[str] = None):
         self.start_label = start_label
         self.end_label = end_label
@@ -35,57 +127,264 @@ class LoopContext:
         self.condition_label = condition_label  # For do_while: continue jumps here
 
 
+def _is_register_name(name: str) -> bool:
+    """Check whether a name refers to a hardware register directly (r0, r12...)."""
+    return name.startswith('r') and name[1:].isdigit()
+
+
+def compute_live_intervals(func: FunctionDef, global_names: Set[str] = frozenset()) -> Tuple[Dict[str, Tuple[int, int]], Set[int]]:
+    """Compute a live interval for every register-held variable of a function.
+    
+    Statements are numbered in source order (parameters live at index 0).
+    A variable is live from its first to its last reference; a variable that
+    is live on entry to a loop stays live until the end of the loop, because
+    the loop's back edge reads it again.
+    
+    Args:
+        func: Function definition to analyze
+        global_names: Names of global variables and arrays (kept in memory)
+        
+    Returns:
+        Tuple of (variable name -> (start, end) statement index,
+        set of register numbers used directly by register variables)
+    """
+    intervals: Dict[str, Tuple[int, int]] = {}
+    arrays: Set[str] = set()
+    reserved: Set[int] = set()
+    loops: List[Tuple[int, int]] = []
+    index = 0
+    
+    def use(name: str, at: int) -> None:
+        if name in global_names:
+            return
+        if _is_register_name(name):
+            reserved.add(int(name[1:]))
+            return
+        if name in intervals:
+            start, end = intervals[name]
+            intervals[name] = (min(start, at), max(end, at))
+        else:
+            intervals[name] = (at, at)
+    
+    def visit_expr(expr: Optional[Expression], at: int) -> None:
+        if isinstance(expr, Identifier):
+            use(expr.name, at)
+        elif isinstance(expr, BinaryOp):
+            visit_expr(expr.left, at)
+            visit_expr(expr.right, at)
+        elif isinstance(expr, (UnaryOp, AddressOf, Dereference)):
+            visit_expr(expr.operand, at)
+        elif isinstance(expr, FunctionCall):
+            for arg in expr.args:
+                visit_expr(arg, at)
+        elif isinstance(expr, ArrayAccess):
+            visit_expr(expr.index, at)
+    
+    def visit_stmt(stmt: Optional[Statement]) -> None:
+        nonlocal index
+        if stmt is None:
+            return
+        if isinstance(stmt, Block):
+            for inner in stmt.statements:
+                visit_stmt(inner)
+            return
+        if isinstance(stmt, ForStmt):
+            visit_stmt(stmt.init)
+        index += 1
+        at = index
+        if isinstance(stmt, (VarDecl, PointerDecl)):
+            use(stmt.name, at)
+            visit_expr(stmt.initializer, at)
+        elif isinstance(stmt, ArrayDecl):
+            arrays.add(stmt.name)
+            for init_expr in stmt.initializer or []:
+                visit_expr(init_expr, at)
+        elif isinstance(stmt, Assignment):
+            visit_expr(stmt.value, at)
+            use(stmt.name, at)
+        elif isinstance(stmt, ArrayAssignment):
+            visit_expr(stmt.index, at)
+            visit_expr(stmt.value, at)
+        elif isinstance(stmt, PointerAssignment):
+            visit_expr(stmt.operand, at)
+            visit_expr(stmt.value, at)
+        elif isinstance(stmt, Return):
+            visit_expr(stmt.value, at)
+        elif isinstance(stmt, FunctionCallStmt):
+            visit_expr(stmt.call, at)
+        elif isinstance(stmt, (Increment, Decrement)):
+            use(stmt.name, at)
+        elif isinstance(stmt, IfStmt):
+            visit_expr(stmt.condition, at)
+            visit_stmt(stmt.then_stmt)
+            visit_stmt(stmt.else_stmt)
+        elif isinstance(stmt, WhileStmt):
+            visit_expr(stmt.condition, at)
+            visit_stmt(stmt.body)
+            loops.append((at, index))
+        elif isinstance(stmt, DoWhileStmt):
+            visit_stmt(stmt.body)
+            index += 1
+            visit_expr(stmt.condition, index)
+            loops.append((at, index))
+        elif isinstance(stmt, ForStmt):
+            visit_expr(stmt.condition, at)
+            visit_stmt(stmt.body)
+            visit_stmt(stmt.increment)
+            loops.append((at, index))
+    
+    for param in func.params:
+        use(param, 0)
+    visit_stmt(func.body)
+    
+    for name in arrays:
+        intervals.pop(name, None)
+    
+    # Extend variables live on entry to a loop over the whole loop
+    changed = True
+    while changed:
+        changed = False
+        for loop_start, loop_end in loops:
+            for name, (start, end) in intervals.items():
+                if start <= loop_start <= end < loop_end:
+                    intervals[name] = (start, loop_end)
+                    changed = True
+    
+    return intervals, reserved
+
+
+class VarInfo:
+    """Symbol table entry for a variable or array.
+    
+    kind is VarInfo.VARIABLE or VarInfo.ARRAY. addr is the data label for
+    globals and arrays, or the stack offset for local variables.
+    """
+    __slots__ = ('kind', 'addr', 'size', 'is_global')
+    
+    VARIABLE = "variable"
+    ARRAY = "array"
+    
+    def __init__(self, kind: str, addr, size: Optional[int] = None, is_global: bool = False):
+        self.kind = kind
+        self.addr = addr
+        self.size = size  # Number of elements (arrays only)
+        self.is_global = is_global
+
+
 class RegisterAllocator:
     """
-    Simple register allocator using fixed register allocation.
+    Register allocator: linear scan for variables, free list for temporaries.
     
     Register allocation strategy:
     - r0: Reserved for function return value
     - r1-r10: Temporary registers (for expression evaluation)
-    - r11-r25: Local variables
-    - r26-r30: Function parameters
+    - r11-r28: Local variables and parameters (assigned by linear scan)
+    - r29: Return address scratch register
+    - r30: Stack pointer
     - r31: Instruction pointer (not allocatable)
+    
+    Before a function body is generated, assign_intervals() maps every
+    variable to a register using its live interval, so variables whose
+    lifetimes do not overlap share a register. Temporaries are handed out
+    from a free list and returned to it by free_temp().
     """
     
-    def __init__(self):
-        # r0-r30 are available for variables (r31 is instruction pointer)
-        # We'll use r0-r10 for temporaries, r11-r25 for local variables, r26-r30 for parameters
-        self.available_registers = list(range(0, 31))  # r0 to r30
+    __slots__ = ('current_function', 'allocated', 'assigned', 'reserved', 'free_temps')
+    
+    TEMP_REGISTERS = range(1, 11)
+    VARIABLE_REGISTERS = range(11, 29)
+    
+    def __init__(self, function_name: Optional[str] = None):
+        self.current_function = function_name
         self.allocated: Dict[str, int] = {}  # variable name -> register number
-        self.temp_counter = 0
-        self.next_temp = 1  # Start with r1 for temporaries (r0 reserved for return value)
+        self.assigned: Dict[str, int] = {}  # linear scan result, claimed by allocate()
+        self.reserved: Set[int] = set()  # registers named directly by register variables
+        # Free temporaries; pop() hands out the lowest register first
+        self.free_temps: List[int] = list(reversed(self.TEMP_REGISTERS))
+    
+    def reset(self, function_name: Optional[str] = None) -> None:
+        """Forget all allocations (in place) before generating another function."""
+        self.current_function = function_name
+        self.allocated.clear()
+        self.assigned.clear()
+        self.reserved.clear()
+        self.free_temps[:] = reversed(self.TEMP_REGISTERS)
+    
+    def assign_intervals(self, intervals: Dict[str, Tuple[int, int]], reserved: Set[int] = frozenset()) -> None:
+        """Assign variable registers by linear scan over live intervals.
         
+        Args:
+            intervals: Variable name -> (first, last) statement index where it is live
+            reserved: Registers used directly by register variables (never handed out)
+        """
+        self.reserved = set(reserved)
+        self.free_temps = [reg for reg in reversed(self.TEMP_REGISTERS) if reg not in self.reserved]
+        free = [reg for reg in self.VARIABLE_REGISTERS if reg not in self.reserved]
+        active: List[Tuple[int, int]] = []  # (end, register), sorted by end
+        
+        for name, (start, end) in sorted(intervals.items(), key=lambda item: item[1][0]):
+            # Expire intervals that ended before this one starts
+            while active and active[0][0] < start:
+                free.append(active.pop(0)[1])
+            if not free:
+                raise RuntimeError(f"Code generation error: Too many variables (register allocation failed for '{name}' in function '{self.current_function}')")
+            reg_num = min(free)
+            free.remove(reg_num)
+            self.assigned[name] = reg_num
+            bisect.insort(active, (end, reg_num))
+    
     def allocate(self, name: str) -> int:
         """Allocate a register for a variable."""
         if name in self.allocated:
             return self.allocated[name]
         
-        # Use registers starting from r11 for variables
-        reg_num = 11 + len(self.allocated)
-        if reg_num > 30:
-            raise RuntimeError(f"Code generation error: Too many variables (register allocation failed for '{name}' in function '{self.current_function}')")
+        reg_num = self.assigned.get(name)
+        if reg_num is None:
+            # Not seen by the liveness pass: take a register no other variable uses
+            used = set(self.assigned.values()) | set(self.allocated.values()) | self.reserved
+            for candidate in self.VARIABLE_REGISTERS:
+                if candidate not in used:
+                    reg_num = candidate
+                    break
+            else:
+                raise RuntimeError(f"Code generation error: Too many variables (register allocation failed for '{name}' in function '{self.current_function}')")
         
         self.allocated[name] = reg_num
         return reg_num
     
+    def claim_register(self, reg_num: int) -> bool:
+        """Reserve a variable register for the whole function if no variable uses it."""
+        if reg_num in self.reserved or reg_num in self.assigned.values() or reg_num in self.allocated.values():
+            return False
+        self.reserved.add(reg_num)
+        return True
+    
     def get_register(self, name: str) -> Optional[int]:
         """Get register number for a variable, or None if not allocated."""
-        if name in self.allocated:
-            return self.allocated[name]
-        return None
+        return self.allocated.get(name)
     
     def get_temp_register(self) -> int:
-        """Get a temporary register."""
-        # Use r1-r10 for temporaries (r0 is reserved for function return value)
-        reg = self.next_temp
-        self.next_temp = (self.next_temp + 1) % 10  # Cycle through r1-r10
-        if reg == 0:
-            reg = 1  # Skip r0, start from r1
-        return reg
+        """Get a free temporary register (r1-r10).
+        
+        The register is never one that is still in use (an unfreed temporary,
+        a variable or a reserved register), so callers need no conflict checks.
+        """
+        if not self.free_temps:
+            raise RuntimeError(f"Code generation error: Out of temporary registers (expression too complex) in function '{self.current_function}'")
+        return self.free_temps.pop()
     
     def free_temp(self, reg: int):
-        """Free a temporary register (does nothing in simple allocator)."""
-        pass
+        """Return a temporary register to the free list.
+        
+        Registers that are not temporaries (variables, r0) and registers that
+        are already free are ignored, so callers may free any expression result.
+        """
+        if reg in self.TEMP_REGISTERS and reg not in self.reserved and reg not in self.free_temps:
+            self.free_temps.append(reg)
+    
+    def release_temps(self) -> None:
+        """Return every temporary register to the free list."""
+        self.free_temps = [reg for reg in reversed(self.TEMP_REGISTERS) if reg not in self.reserved]
 
 
 class CodeGenerator:
@@ -99,17 +398,62 @@ class CodeGenerator:
         self.function_labels: Dict[str, str] = {}
         self.current_function: Optional[str] = None
         self._has_explicit_return = False  # Track if current function has explicit return
+        self._has_inline_asm = False  # Current function contains asm {} (skip peephole)
+        self._const_regs: Dict[int, int] = {}  # constant value -> register (per function)
+        self._prologue_index = 0  # Where constant registers are loaded in self.code
+        self._array_base_regs: Dict[str, int] = {}  # array label -> register holding its address (per function)
+        self._call_returns: List[int] = []  # Indices in self.code right after each call returns
         
         # Loop context stack for break/continue support
         self.loop_stack: List[LoopContext] = []
         
         # Memory management
-        self.array_addresses: Dict[str, str] = {}  # array name -> label name (all arrays in memory)
-        self.array_sizes: Dict[str, int] = {}  # array name -> size
-        self.variable_addresses: Dict[str, int] = {}  # var name -> address (stack offset or label)
+        # name -> VarInfo; function locals shadow globals and are dropped when the function ends
+        self.symbols: Dict[str, VarInfo] = {}
         self.stack_offset: int = 0  # Current offset from base stack address (r30) - only for variables, not arrays
         self.data_section: List[str] = []  # Global data section
-        self.global_data_labels: Dict[str, str] = {}  # Global variable/array name -> label
+        
+        # AST node type -> generator method (one dict lookup per node instead
+        # of an isinstance chain)
+        self._statement_handlers = {
+            VarDecl: self.generate_var_decl,
+            ArrayDecl: self.generate_array_decl,
+            PointerDecl: self.generate_pointer_decl,
+            Assignment: self.generate_assignment,
+            ArrayAssignment: self.generate_array_assignment,
+            PointerAssignment: self.generate_pointer_assignment,
+            Return: self.generate_return,
+            IfStmt: self.generate_if,
+            WhileStmt: self.generate_while,
+            DoWhileStmt: self.generate_do_while,
+            ForStmt: self.generate_for,
+            Block: self.generate_block,
+            FunctionCallStmt: self.generate_function_call_stmt,
+            Increment: self.generate_increment,
+            Decrement: self.generate_decrement,
+            BreakStmt: self.generate_break,
+            ContinueStmt: self.generate_continue,
+            AsmStmt: self.generate_asm,
+        }
+        self._binary_op_handlers = dict.fromkeys(_ALU_INSTRUCTIONS, self._emit_alu_op)
+        self._binary_op_handlers.update(dict.fromkeys(_COMPARISON_OPS, self._emit_comparison))
+        self._binary_op_handlers.update({
+            '*': self._emit_multiply,
+            '/': self._emit_divide,
+            '%': self._emit_divide,
+            '&&': self._emit_logical_and,
+            '||': self._emit_logical_or,
+        })
+        self._expression_handlers = {
+            Literal: self.generate_literal,
+            Identifier: self.generate_identifier,
+            ArrayAccess: self.generate_array_access,
+            AddressOf: self.generate_address_of,
+            Dereference: self.generate_dereference,
+            BinaryOp: self.generate_binary_op,
+            UnaryOp: self.generate_unary_op,
+            FunctionCall: self.generate_function_call,
+        }
         
     def generate_label(self, prefix: str = "L") -> str:
         """Generate a unique label."""
@@ -119,84 +463,65 @@ class CodeGenerator:
     
     def emit(self, instruction: str):
         """Emit an assembly instruction."""
-        self.code.append(f"\t{instruction}")
+        # Plain concatenation: cheaper than an f-string for a single prefix
+        self.code.append("\t" + instruction)
     
     def emit_label(self, label: str):
         """Emit a label."""
         # In FASM with ISA.inc, labels need 'addr' prefix for addresses
         # But for code labels (for jumps), we can use labels directly
-        self.code.append(f"{label}:")
+        self.code.append(label + ":")
     
     def emit_comment(self, comment: str):
         """Emit a comment."""
-        self.code.append(f"\t; {comment}")
+        self.code.append("\t; " + comment)
     
     def get_register_name(self, reg_num: int) -> str:
         """Convert register number to FASM format."""
-        # FASM ISA.inc uses format r:0, r:1, etc. (with colon)
-        return f"r:{reg_num}"
+        return _REG_NAMES[reg_num]
     
-    def generate(self, output_file: str = None) -> str:
-        """Generate complete assembly program."""
+    def generate(self, output_file: str = None, out: Optional[TextIO] = None) -> Optional[str]:
+        """Generate complete assembly program.
+
+        Returns the assembly text, or writes it line by line to out (an
+        open text file) and returns None, so that no single string of the
+        whole program is built.
+        """
         self.code = []
+        # A failed earlier run may have left loop contexts behind
+        self.loop_stack.clear()
         
         # Add commented format binary (as in calc.asm)
         # format binary is already in ISA.inc, so we comment it out
         self.code.append(";format binary")
         self.code.append("")
         
+        # Find main (entry point) and the other functions in one pass
+        main_func = None
+        other_funcs = []
+        for func in self.program.functions:
+            # Main function uses just "main:" label, others use "func_name:"
+            if func.name == 'main':
+                main_func = func
+                self.function_labels[func.name] = "main"
+            else:
+                other_funcs.append(func)
+                self.function_labels[func.name] = f"func_{func.name}"
+        
         # Include ISA.inc from int_pack directory (it contains "format binary")
         # Calculate path relative to output file location
         if output_file:
-            # Get absolute paths
-            output_abs = os.path.abspath(output_file)
-            output_dir = os.path.dirname(output_abs)
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            int_pack_isa = os.path.join(script_dir, "int_pack", "ISA.inc")
-            
-            # Try to find relative path from output directory to int_pack
-            try:
-                rel_path = os.path.relpath(int_pack_isa, output_dir)
-                # Use forward slashes for FASM (works on Windows too)
-                rel_path = rel_path.replace('\\', '/')
-                self.code.append(f'include "{rel_path}"')
-            except ValueError:
-                # If relative path fails (different drives on Windows), use absolute path
-                # Use forward slashes
-                int_pack_isa_normalized = int_pack_isa.replace('\\', '/')
-                self.code.append(f'include "{int_pack_isa_normalized}"')
+            output_dir = os.path.dirname(os.path.abspath(output_file))
+            self.code.append(f'include "{self._resolve_include("ISA.inc", output_dir)}"')
+            # Include macros.inc for entry macro (only if main function exists)
+            if main_func:
+                self.code.append(f'include "{self._resolve_include("macros.inc", output_dir)}"')
         else:
             # Default: assume int_pack is relative to project root
             self.code.append('include "../int_pack/ISA.inc"')
         
-        # Include macros.inc for entry macro (if main function exists)
-        if output_file:
-            output_abs = os.path.abspath(output_file)
-            output_dir = os.path.dirname(output_abs)
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            int_pack_macros = os.path.join(script_dir, "int_pack", "macros.inc")
-            
-            try:
-                rel_path = os.path.relpath(int_pack_macros, output_dir)
-                rel_path = rel_path.replace('\\', '/')
-                # Only include if main function exists
-                if any(f.name == 'main' for f in self.program.functions):
-                    self.code.append(f'include "{rel_path}"')
-            except ValueError:
-                int_pack_macros_normalized = int_pack_macros.replace('\\', '/')
-                if any(f.name == 'main' for f in self.program.functions):
-                    self.code.append(f'include "{int_pack_macros_normalized}"')
-        
         self.code.append("")
         
-        # Generate function labels
-        for func in self.program.functions:
-            # Main function uses just "main:" label, others use "func_name:"
-            if func.name == 'main':
-                self.function_labels[func.name] = "main"
-            else:
-                self.function_labels[func.name] = f"func_{func.name}"
-        
         # Generate global variables and arrays first
         for global_var in self.program.global_vars:
             if isinstance(global_var, ArrayDecl):
@@ -206,15 +531,6 @@ class CodeGenerator:
             elif isinstance(global_var, VarDecl):
                 self.generate_var_decl(global_var)
         
-        # Generate main function first (entry point)
-        main_func = None
-        other_funcs = []
-        for func in self.program.functions:
-            if func.name == 'main':
-                main_func = func
-            else:
-                other_funcs.append(func)
-        
         # Generate entry point for main (using entry macro from macros.inc)
         if main_func:
             self.code.append("entry main")
@@ -228,20 +544,45 @@ class CodeGenerator:
         for func in other_funcs:
             self.generate_function(func)
         
-        # Generate data section for global arrays and variables
+        # Generate data section for global arrays and variables.
+        # The data section is kept in its own buffer and written out after
+        # the code instead of being copied into self.code first.
+        lines = self.code
         if self.data_section:
             self.code.append("")
             self.code.append("; Data section")
-            self.code.extend(self.data_section)
+            lines = chain(self.code, self.data_section)
         
-        return "\n".join(self.code)
+        if out is None:
+            return "\n".join(lines)
+        for line in lines:
+            out.write(line)
+            out.write("\n")
+        return None
+    
+    def _resolve_include(self, filename: str, output_dir: str) -> str:
+        """Path of an int_pack include file as seen from the output directory."""
+        include_path = os.path.join(_INT_PACK_DIR, filename)
+        try:
+            include_path = os.path.relpath(include_path, output_dir)
+        except ValueError:
+            # If relative path fails (different drives on Windows), use absolute path
+            pass
+        # Use forward slashes for FASM (works on Windows too)
+        return include_path.replace('\\', '/')
     
     def generate_function(self, func: FunctionDef) -> None:
         """Generate assembly code for a function."""
         old_func = self.current_function
         self.current_function = func.name
-        old_allocator = self.reg_allocator
-        self.reg_allocator = RegisterAllocator()
+        old_symbols = self.symbols
+        self.symbols = dict(old_symbols)
+        # One allocator serves every function: functions are generated one
+        # after another, so it is simply reset instead of re-created
+        self.reg_allocator.reset(func.name)
+        global_names = {name for name, info in self.symbols.items() if info.is_global}
+        intervals, reserved = compute_live_intervals(func, global_names)
+        self.reg_allocator.assign_intervals(intervals, reserved)
         
         # Save and reset stack offset for this function
         old_stack_offset = self.stack_offset
@@ -249,45 +590,51 @@ class CodeGenerator:
         
         # Function label
         self.code.append("")
+        function_start = len(self.code)
+        self._has_inline_asm = False
         self.emit_label(self.function_labels[func.name])
         self.emit_comment(f"Function: {func.name}")
         
-        # Function entry: return address and parameters are on stack (pushed by caller)
-        # r:30 is the stack pointer (initialized to 4096 by entry macro)
-        # Stack layout: [return_addr][param0][param1]...[paramN] (r:30 points to return_addr)
-        # We need to account for return address + parameters in stack offset tracking
+        # Function entry: the first ARGUMENT_REGISTERS parameters arrive in
+        # r:1, r:2, ...; the rest and the return address are on the stack
+        # (pushed by caller). r:30 is the stack pointer (initialized to 4096
+        # by entry macro).
+        # Stack layout: [return_addr][param5][param6]... (r:30 points to return_addr)
+        stack_params = func.params[ARGUMENT_REGISTERS:]
         if func.name != 'main':
             self.stack_offset += 1  # Account for return address on stack
-            self.stack_offset += len(func.params)  # Account for parameters on stack
-        
-        # Load parameters from stack
-        # Parameters are on stack in order: first parameter on top (after return address)
-        # Stack layout: [return_addr][param0][param1]...[paramN] (r:30 points to return_addr)
-        # We need to pop return address first, then load parameters
-        param_regs = []
-        temp_reg = self.reg_allocator.get_temp_register()
-        
-        # First, pop return address (it's already accounted for in stack_offset)
-        # Parameters start at [r:30+1], [r:30+2], etc.
-        for i, param in enumerate(func.params):
-            # Allocate a register for the parameter
-            param_reg = self.reg_allocator.allocate(param)
-            param_regs.append(param_reg)
-            
-            # Load parameter from stack: [r:30 + 1 + i]
-            # We need to calculate address: r:30 + 1 + i
-            addr_reg = self.reg_allocator.get_temp_register()
-            offset = 1 + i  # +1 for return address, +i for parameter index
-            self.emit(f"mov {self.get_register_name(addr_reg)}, r:30")
-            if offset > 0:
-                offset_reg = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(offset_reg)}, {offset}")
-                self.emit(f"add {self.get_register_name(addr_reg)}, {self.get_register_name(addr_reg)}, {self.get_register_name(offset_reg)}")
-                self.reg_allocator.free_temp(offset_reg)
-            self.emit(f"lds {self.get_register_name(param_reg)}, [{self.get_register_name(addr_reg)}]")
-            self.reg_allocator.free_temp(addr_reg)
+            self.stack_offset += len(stack_params)  # Account for parameters on stack
+        
+        if func.params:
+            rn = _REG_NAMES
+            emit = self.emit
+            allocate = self.reg_allocator.allocate
+            # Copy register parameters first: the address register used for
+            # stack parameters below is one of r:1-r:10
+            for i, param in enumerate(func.params[:ARGUMENT_REGISTERS]):
+                emit(f"mov {rn[allocate(param)]}, {rn[i + 1]}")
+            
+            # r:30 does not move while parameters are loaded, so one address
+            # register walks the parameter slots: [r:30+1], [r:30+2], ...
+            # (the ISA has no [reg+imm] addressing, so each slot costs add + lds)
+            if stack_params:
+                addr_reg = self.reg_allocator.get_temp_register()
+                addr_name = rn[addr_reg]
+                emit(f"add {addr_name}, r:30, 1")  # Skip the return address
+                for i, param in enumerate(stack_params):
+                    if i > 0:
+                        emit(f"add {addr_name}, {addr_name}, 1")
+                    emit(f"lds {rn[allocate(param)]}, [{addr_name}]")
+                self.reg_allocator.free_temp(addr_reg)
         
-        self.reg_allocator.free_temp(temp_reg)
+        # Constant registers are loaded here once the body is generated
+        old_const_regs = self._const_regs
+        old_array_base_regs = self._array_base_regs
+        old_call_returns = self._call_returns
+        self._const_regs = {}
+        self._array_base_regs = {}
+        self._call_returns = []
+        self._prologue_index = len(self.code)
         
         # Track if function has explicit return
         # We'll set this flag when we encounter a return statement
@@ -319,74 +666,72 @@ class CodeGenerator:
         
         # Reset flag
         self._has_explicit_return = False
+        
+        # A callee may use the array base registers for its own variables,
+        # so they are reloaded wherever a call returns (last call first, so
+        # the recorded indices stay valid)
+        if self._array_base_regs:
+            reloads = [f"\tmov {_REG_NAMES[reg_num]}, {label} addr" for label, reg_num in self._array_base_regs.items()]
+            for index in reversed(self._call_returns):
+                self.code[index:index] = reloads
+        
+        # Load the constants and array addresses used by the body once, at
+        # function entry
+        if self._const_regs or self._array_base_regs:
+            body = self.code[self._prologue_index:]
+            del self.code[self._prologue_index:]
+            for value, reg_num in sorted(self._const_regs.items(), key=lambda item: item[1]):
+                self._emit_load_constant(reg_num, value)
+            for label, reg_num in self._array_base_regs.items():
+                self.emit(f"mov {_REG_NAMES[reg_num]}, {label} addr")
+            self.code.extend(body)
+        self._const_regs = old_const_regs
+        self._array_base_regs = old_array_base_regs
+        self._call_returns = old_call_returns
+        
+        # Peephole-optimize the function body (hand-written asm is left as is).
+        # Labels inside the body are only jumped to from the body itself, so
+        # unused ones can go; the function label is called from elsewhere.
+        if not self._has_inline_asm:
+            self.code[function_start + 1:] = peephole(self.code[function_start + 1:], drop_unused_labels=True)
 
         self.current_function = old_func
-        self.reg_allocator = old_allocator
+        self.symbols = old_symbols
         self.stack_offset = old_stack_offset
     
     def generate_statement(self, stmt: Statement) -> None:
         """Generate assembly code for a statement."""
-        if isinstance(stmt, VarDecl):
-            self.generate_var_decl(stmt)
-        elif isinstance(stmt, ArrayDecl):
-            self.generate_array_decl(stmt)
-        elif isinstance(stmt, PointerDecl):
-            self.generate_pointer_decl(stmt)
-        elif isinstance(stmt, Assignment):
-            self.generate_assignment(stmt)
-        elif isinstance(stmt, ArrayAssignment):
-            self.generate_array_assignment(stmt)
-        elif isinstance(stmt, PointerAssignment):
-            self.generate_pointer_assignment(stmt)
-        elif isinstance(stmt, Return):
-            self.generate_return(stmt)
-        elif isinstance(stmt, IfStmt):
-            self.generate_if(stmt)
-        elif isinstance(stmt, WhileStmt):
-            self.generate_while(stmt)
-        elif isinstance(stmt, DoWhileStmt):
-            self.generate_do_while(stmt)
-        elif isinstance(stmt, ForStmt):
-            self.generate_for(stmt)
-        elif isinstance(stmt, Block):
-            self.generate_block(stmt)
-        elif isinstance(stmt, FunctionCallStmt):
-            # FunctionCallStmt wraps a FunctionCall - just ignore return value
-            # Check if it's a hardware function - if so, generate without result register
-            if stmt.call.name not in self.function_labels:
-                # Hardware function - generate code without allocating result register
+        handler = self._statement_handlers.get(type(stmt))
+        if handler is None:
+            raise RuntimeError(f"Code generation error: Unknown statement type '{type(stmt).__name__}' in function '{self.current_function}'")
+        handler(stmt)
+    
+    def generate_function_call_stmt(self, stmt: FunctionCallStmt) -> None:
+        """Generate code for a function call used as a statement (result ignored)."""
+        # Check if it's a hardware function - if so, generate without result register
+        if stmt.call.name not in self.function_labels:
+            # Hardware function - generate code without allocating result register
+            if stmt.call.name == 'uart_write':
                 args = [self.generate_expression(arg) for arg in stmt.call.args]
-                if stmt.call.name == 'uart_write':
-                    if len(args) != 1:
-                        raise RuntimeError(f"Code generation error: uart_write expects 1 argument, got {len(args)}")
-                    data_reg = args[0]
-                    self.emit(f"outu {self.get_register_name(data_reg)}")
-                    self.reg_allocator.free_temp(data_reg)
-                else:
-                    # For other hardware functions, still need result register (but ignore it)
-                    result_reg = self.generate_function_call(stmt.call)
-                    if result_reg != 0:
-                        self.reg_allocator.free_temp(result_reg)
+                if len(args) != 1:
+                    raise RuntimeError(f"Code generation error: uart_write expects 1 argument, got {len(args)}")
+                data_reg = args[0]
+                self.emit(f"outu {_REG_NAMES[data_reg]}")
+                self.reg_allocator.free_temp(data_reg)
             else:
-                # Regular function call - generate normally but ignore result
+                # For other hardware functions, still need result register (but ignore it)
                 result_reg = self.generate_function_call(stmt.call)
                 if result_reg != 0:
                     self.reg_allocator.free_temp(result_reg)
-        elif isinstance(stmt, Increment):
-            self.generate_increment(stmt)
-        elif isinstance(stmt, Decrement):
-            self.generate_decrement(stmt)
-        elif isinstance(stmt, BreakStmt):
-            self.generate_break(stmt)
-        elif isinstance(stmt, ContinueStmt):
-            self.generate_continue(stmt)
-        elif isinstance(stmt, AsmStmt):
-            self.generate_asm(stmt)
         else:
-            raise RuntimeError(f"Code generation error: Unknown statement type '{type(stmt).__name__}' in function '{self.current_function}'")
+            # Regular function call - generate normally but ignore result
+            result_reg = self.generate_function_call(stmt.call)
+            if result_reg != 0:
+                self.reg_allocator.free_temp(result_reg)
     
     def generate_asm(self, stmt: AsmStmt) -> None:
         """Emit inline assembly block content as raw lines into the output."""
+        self._has_inline_asm = True
         for line in stmt.content.splitlines():
             stripped = line.strip()
             if stripped:
@@ -409,14 +754,13 @@ class CodeGenerator:
             if decl.initializer:
                 value_reg = self.generate_expression(decl.initializer)
                 if value_reg != reg_num:
-                    self.emit(f"mov {self.get_register_name(reg_num)}, {self.get_register_name(value_reg)}")
+                    self.emit(f"mov {_REG_NAMES[reg_num]}, {_REG_NAMES[value_reg]}")
                     self.reg_allocator.free_temp(value_reg)
             return
         
         if is_global:
             # Global variable - allocate in data section
             label = f"var_{decl.name}"
-            self.global_data_labels[decl.name] = label
             self.data_section.append(f"{label}:")
             if decl.initializer:
                 if isinstance(decl.initializer, Literal):
@@ -427,24 +771,24 @@ class CodeGenerator:
                     self.data_section.append(f"\tdd 0")
             else:
                 self.data_section.append(f"\tdd 0")
-            self.variable_addresses[decl.name] = label
+            self.symbols[decl.name] = VarInfo(VarInfo.VARIABLE, label, is_global=True)
         else:
             # Local variable - allocate register
             reg_num = self.reg_allocator.allocate(decl.name)
             
             # Track address (stack offset)
-            self.variable_addresses[decl.name] = self.stack_offset
+            self.symbols[decl.name] = VarInfo(VarInfo.VARIABLE, self.stack_offset)
             self.stack_offset += 1
             
             # Initialize if needed
             if decl.initializer:
                 value_reg = self.generate_expression(decl.initializer)
                 if value_reg != reg_num:
-                    self.emit(f"mov {self.get_register_name(reg_num)}, {self.get_register_name(value_reg)}")
+                    self.emit(f"mov {_REG_NAMES[reg_num]}, {_REG_NAMES[value_reg]}")
                     self.reg_allocator.free_temp(value_reg)
             else:
                 # Initialize to 0
-                self.emit(f"mov {self.get_register_name(reg_num)}, 0")
+                self.emit(f"mov {_REG_NAMES[reg_num]}, 0")
     
     def generate_assignment(self, assign: Assignment) -> None:
         """Generate code for assignment."""
@@ -452,23 +796,16 @@ class CodeGenerator:
         value_reg = self.generate_expression(assign.value)
         
         # Check if this is a global variable
-        if assign.name in self.global_data_labels:
+        info = self.symbols.get(assign.name)
+        if info is not None and info.is_global:
             # Global variable - store to memory
-            label = self.global_data_labels[assign.name]
-            # Allocate address register, making sure it's different from value_reg
-            addr_reg = self.reg_allocator.get_temp_register()
-            while addr_reg == value_reg:
-                self.reg_allocator.free_temp(addr_reg)
-                addr_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(addr_reg)}, {label} addr")
-            self.emit(f"lds [{self.get_register_name(addr_reg)}], {self.get_register_name(value_reg)}")
-            self.reg_allocator.free_temp(addr_reg)
+            self._emit_store_global(info.addr, value_reg)
             self.reg_allocator.free_temp(value_reg)
         else:
             # Local variable - store in register
             target_reg = self.reg_allocator.get_register(assign.name)
             if target_reg is None:
-                if assign.name.startswith('r') and assign.name[1:].isdigit():
+                if _is_register_name(assign.name):
                     # Direct register access
                     target_reg = int(assign.name[1:])
                 else:
@@ -477,30 +814,78 @@ class CodeGenerator:
             
             # Move value to target
             if value_reg != target_reg:
-                self.emit(f"mov {self.get_register_name(target_reg)}, {self.get_register_name(value_reg)}")
+                self.emit(f"mov {_REG_NAMES[target_reg]}, {_REG_NAMES[value_reg]}")
             
             self.reg_allocator.free_temp(value_reg)
     
     def generate_expression(self, expr: Expression) -> int:
         """Generate code for expression and return register containing result."""
-        if isinstance(expr, Literal):
-            return self.generate_literal(expr)
-        elif isinstance(expr, Identifier):
-            return self.generate_identifier(expr)
-        elif isinstance(expr, ArrayAccess):
-            return self.generate_array_access(expr)
-        elif isinstance(expr, AddressOf):
-            return self.generate_address_of(expr)
-        elif isinstance(expr, Dereference):
-            return self.generate_dereference(expr)
-        elif isinstance(expr, BinaryOp):
-            return self.generate_binary_op(expr)
-        elif isinstance(expr, UnaryOp):
-            return self.generate_unary_op(expr)
-        elif isinstance(expr, FunctionCall):
-            return self.generate_function_call(expr)
-        else:
+        handler = self._expression_handlers.get(type(expr))
+        if handler is None:
             raise RuntimeError(f"Code generation error: Unknown expression type '{type(expr).__name__}' in function '{self.current_function}'")
+        return handler(expr)
+    
+    def _emit_load_constant(self, reg_num: int, value: int) -> None:
+        """Load a 32-bit constant into a register."""
+        reg = _REG_NAMES[reg_num]
+        value &= _MASK32
+        if value <= _MAX_IMMEDIATE:
+            self.emit(f"mov {reg}, {value}")
+        elif value ^ _MASK32 <= _MAX_IMMEDIATE:
+            # Small negative numbers (e.g. all ones): complement of a short value
+            self.emit(f"mov {reg}, {value ^ _MASK32}")
+            self.emit(f"not {reg}, {reg}")
+        else:
+            # Upper 20 bits, shifted into place, then the low bits
+            low = value & ((1 << _WIDE_LOW_BITS) - 1)
+            self.emit(f"mov {reg}, {value >> _WIDE_LOW_BITS}")
+            self.emit(f"shl {reg}, {reg}, {_WIDE_LOW_BITS}")
+            if low:
+                self.emit(f"or {reg}, {reg}, {low}")
+    
+    def _get_const_reg(self, value: int) -> int:
+        """Get a register holding a constant.
+        
+        Values with a dedicated constant register are loaded once at function
+        entry and the same register is returned on every use; otherwise the
+        constant is loaded into a temporary register here.
+        
+        Returns:
+            Register number containing the value (free it with free_temp)
+        """
+        value &= _MASK32
+        reg_num = self._const_regs.get(value)
+        if reg_num is not None:
+            return reg_num
+        reg_num = _CONSTANT_REGISTERS.get(value)
+        if reg_num is not None and self.reg_allocator.claim_register(reg_num):
+            self._const_regs[value] = reg_num
+            return reg_num
+        temp_reg = self.reg_allocator.get_temp_register()
+        self._emit_load_constant(temp_reg, value)
+        return temp_reg
+    
+    def _get_array_base_reg(self, label: str) -> int:
+        """Get a register holding the address of the array at label.
+        
+        The first use in a function claims a variable register that no
+        variable of the function needs; it is loaded once at function entry
+        and reused by every later access. Without a spare register the
+        address is loaded into a temporary here.
+        
+        Returns:
+            Register number containing the address (free it with free_temp)
+        """
+        reg_num = self._array_base_regs.get(label)
+        if reg_num is not None:
+            return reg_num
+        for reg_num in reversed(RegisterAllocator.VARIABLE_REGISTERS):
+            if reg_num not in _CONSTANT_REGISTERS.values() and self.reg_allocator.claim_register(reg_num):
+                self._array_base_regs[label] = reg_num
+                return reg_num
+        temp_reg = self.reg_allocator.get_temp_register()
+        self.emit(f"mov {_REG_NAMES[temp_reg]}, {label} addr")
+        return temp_reg
     
     def generate_literal(self, lit: Literal) -> int:
         """Generate code for literal and return register with value.
@@ -512,30 +897,42 @@ class CodeGenerator:
             Register number containing the literal value
         """
         temp_reg = self.reg_allocator.get_temp_register()
-        # For now, use mov with immediate (if ISA supports it)
-        # Otherwise, we'd need to load from memory
-        # Assuming ISA supports: mov r0, 42 (immediate in op2)
-        value = lit.value & 0xFFFFFFFF
-        self.emit(f"mov {self.get_register_name(temp_reg)}, {value}")
+        # Values wider than the 20-bit mov immediate take several instructions
+        self._emit_load_constant(temp_reg, lit.value)
         return temp_reg
     
+    def _emit_load_global(self, dst_reg: int, label: str) -> None:
+        """Load the global variable at label into dst_reg.
+        
+        lds only accepts a register address, so the label address is
+        loaded into dst_reg first and then replaced by the value.
+        """
+        dst = _REG_NAMES[dst_reg]
+        self.emit(f"mov {dst}, {label} addr")
+        self.emit(f"lds {dst}, [{dst}]")
+    
+    def _emit_store_global(self, label: str, src_reg: int) -> None:
+        """Store src_reg to the global variable at label."""
+        addr_reg = self.reg_allocator.get_temp_register()
+        addr = _REG_NAMES[addr_reg]
+        self.emit(f"mov {addr}, {label} addr")
+        self.emit(f"lds [{addr}], {_REG_NAMES[src_reg]}")
+        self.reg_allocator.free_temp(addr_reg)
+    
     def generate_identifier(self, ident: Identifier) -> int:
         """Generate code for identifier access."""
         # Check if this is a global variable
-        if ident.name in self.global_data_labels:
+        info = self.symbols.get(ident.name)
+        if info is not None and info.is_global:
             # Global variable - load from memory
-            label = self.global_data_labels[ident.name]
             result_reg = self.reg_allocator.get_temp_register()
-            addr_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(addr_reg)}, {label} addr")
-            self.emit(f"lds {self.get_register_name(result_reg)}, [{self.get_register_name(addr_reg)}]")
-            self.reg_allocator.free_temp(addr_reg)
+            self._emit_load_global(result_reg, info.addr)
             return result_reg
         
         # Local variable - get from register
         reg = self.reg_allocator.get_register(ident.name)
         if reg is None:
-            if ident.name.startswith('r') and ident.name[1:].isdigit():
+            if _is_register_name(ident.name):
                 reg = int(ident.name[1:])
             else:
                 raise RuntimeError(f"Code generation error: Undefined variable '{ident.name}' in function '{self.current_function}'")
@@ -554,401 +951,314 @@ class CodeGenerator:
             
         Supported operators: +, -, *, /, %, &, |, ^, <<, >>, ==, !=, <, <=, >, >=, &&, ||
         """
+        # Constant operands: compute the value at compile time
+        value = self.fold_constant(op)
+        if value is not None:
+            return self.generate_literal(Literal(value))
+        
+        # x + -y is x - y and x - -y is x + y: y is never negated
+        right = op.right
+        if op.op in ('+', '-') and isinstance(right, UnaryOp) and right.op == '-':
+            return self.generate_binary_op(BinaryOp('-' if op.op == '+' else '+', op.left, right.operand))
+        
+        # Identities with one constant operand (x + 0, x * 1, x * 2^k, ...)
+        identity_reg = self._generate_identity(op)
+        if identity_reg is not None:
+            return identity_reg
+        
+        handler = self._binary_op_handlers.get(op.op)
+        if handler is None:
+            raise RuntimeError(f"Code generation error: Unknown binary operator '{op.op}' in function '{self.current_function}'")
+        
         left_reg = self.generate_expression(op.left)
         right_reg = self.generate_expression(op.right)
+        if op.op in _OPERANDS_READ_FIRST:
+            # Both operands are dead once the first instruction has read
+            # them, so the result may take over one of their registers
+            self.reg_allocator.free_temp(right_reg)
+            self.reg_allocator.free_temp(left_reg)
+            result_reg = self.reg_allocator.get_temp_register()
+            handler(op, result_reg, left_reg, right_reg)
+            return result_reg
         result_reg = self.reg_allocator.get_temp_register()
+        handler(op, result_reg, left_reg, right_reg)
+        self.reg_allocator.free_temp(left_reg)
+        self.reg_allocator.free_temp(right_reg)
+        return result_reg
+    
+    def _emit_alu_op(self, op: BinaryOp, result_reg: int, left_reg: int, right_reg: int) -> None:
+        """Three-operand instruction: result = left op right."""
+        rn = _REG_NAMES
+        self.emit(f"{_ALU_INSTRUCTIONS[op.op]} {rn[result_reg]}, {rn[left_reg]}, {rn[right_reg]}")
+    
+    def _emit_multiply(self, op: BinaryOp, result_reg: int, left_reg: int, right_reg: int) -> None:
+        """Multiplication: shift-and-add (at most 32 iterations).
         
-        op_map = {
-            '+': 'add',
-            '-': 'sub',
-            '&': 'and',
-            '|': 'or',
-            '^': 'xor',
-            '<<': 'shl',
-            '>>': 'shr',
-        }
+        Each iteration tests the low bit of right_temp; if it is set the
+        shifted multiplicand is added to the result. The loop ends as soon
+        as no set bits remain in right_temp.
+        """
+        # Bound once: the loop body emits many instructions
+        emit = self.emit
+        rn = _REG_NAMES
+        get_temp = self.reg_allocator.get_temp_register
+        free_temp = self.reg_allocator.free_temp
+        gen_label = self.generate_label
+        
+        # Copy operands to temporary registers to avoid modifying originals
+        left_temp = get_temp()
+        right_temp = get_temp()
+        emit(f"mov {rn[left_temp]}, {rn[left_reg]}")
+        emit(f"mov {rn[right_temp]}, {rn[right_reg]}")
+        
+        # result = 0
+        emit(f"mov {rn[result_reg]}, 0")
+        loop_label = gen_label("mul_loop")
+        skip_label = gen_label("mul_skip")
+        end_label = gen_label("mul_end")
+        
+        self.emit_label(loop_label)
+        # No bits left in right_temp - done
+        emit(f"cmovz r:31, {rn[right_temp]}, {end_label} addr")
+        
+        # If the low bit of right_temp is set, add left_temp to result
+        bit_reg = get_temp()
+        emit(f"and {rn[bit_reg]}, {rn[right_temp]}, 1")
+        emit(f"cmovz r:31, {rn[bit_reg]}, {skip_label} addr")
+        emit(f"add {rn[result_reg]}, {rn[result_reg]}, {rn[left_temp]}")
+        self.emit_label(skip_label)
+        
+        # left_temp <<= 1, right_temp >>= 1
+        emit(f"shl {rn[left_temp]}, {rn[left_temp]}, 1")
+        emit(f"shr {rn[right_temp]}, {rn[right_temp]}, 1")
+        
+        # Jump back to loop
+        emit(f"mov r:31, {loop_label} addr")
+        self.emit_label(end_label)
         
-        if op.op in op_map:
-            # Three-operand instruction: result = left op right
-            self.emit(f"{op_map[op.op]} {self.get_register_name(result_reg)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-        elif op.op == '*':
-            # Multiplication: use repeated addition
-            # Copy operands to temporary registers to avoid modifying originals
-            left_temp = self.reg_allocator.get_temp_register()
-            right_temp = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(left_temp)}, {self.get_register_name(left_reg)}")
-            self.emit(f"mov {self.get_register_name(right_temp)}, {self.get_register_name(right_reg)}")
-            
-            # result = 0
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-            loop_label = self.generate_label("mul_loop")
-            end_label = self.generate_label("mul_end")
-            
-            self.emit_label(loop_label)
-            # Check if right_temp == 0, if so exit
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            self.emit(f"cmovz r:31, {self.get_register_name(right_temp)}, {end_label} addr")
-            
-            # Add left_temp to result
-            self.emit(f"add {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(left_temp)}")
-            # Decrement right_temp
-            one_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-            self.emit(f"sub {self.get_register_name(right_temp)}, {self.get_register_name(right_temp)}, {self.get_register_name(one_reg)}")
-            
-            # Jump back to loop
-            self.emit(f"mov r:31, {loop_label} addr")
-            self.emit_label(end_label)
-            
-            self.reg_allocator.free_temp(left_temp)
-            self.reg_allocator.free_temp(right_temp)
-            self.reg_allocator.free_temp(zero_reg)
-            self.reg_allocator.free_temp(one_reg)
-        elif op.op == '/':
-            # Division: use repeated subtraction
-            # Copy operands to temporary registers to avoid modifying originals
-            left_temp = self.reg_allocator.get_temp_register()
-            right_temp = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(left_temp)}, {self.get_register_name(left_reg)}")
-            self.emit(f"mov {self.get_register_name(right_temp)}, {self.get_register_name(right_reg)}")
-            
-            # result = 0
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-            loop_label = self.generate_label("div_loop")
-            end_label = self.generate_label("div_end")
-            
-            # Check for division by zero
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            error_label = self.generate_label("div_error")
-            self.emit(f"cmovz r:31, {self.get_register_name(right_temp)}, {error_label} addr")
-            
-            self.emit_label(loop_label)
-            # Check if left_temp < right_temp, if so exit
-            # cmpb returns -1 if left < right, 0 if left >= right
-            temp_cmp = self.reg_allocator.get_temp_register()
-            self.emit(f"cmpb {self.get_register_name(temp_cmp)}, {self.get_register_name(left_temp)}, {self.get_register_name(right_temp)}")
-            # If temp_cmp != 0 (i.e., == -1, meaning left < right), jump to end
-            zero_reg2 = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg2)}, 0")
-            self.emit(f"cmovnz r:31, {self.get_register_name(temp_cmp)}, {end_label} addr")
-            
-            # Subtract right_temp from left_temp
-            self.emit(f"sub {self.get_register_name(left_temp)}, {self.get_register_name(left_temp)}, {self.get_register_name(right_temp)}")
-            # Increment result
-            one_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-            self.emit(f"add {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(one_reg)}")
-            
-            # Jump back to loop
-            self.emit(f"mov r:31, {loop_label} addr")
-            self.emit_label(end_label)
-            
-            # Jump over error label to avoid executing it
-            skip_error_label = self.generate_label("div_skip_error")
-            self.emit(f"mov r:31, {skip_error_label} addr")
-            
-            # Error label (division by zero)
-            self.emit_label(error_label)
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-            
-            self.emit_label(skip_error_label)
-            
-            self.reg_allocator.free_temp(zero_reg2)
-            
-            self.reg_allocator.free_temp(left_temp)
-            self.reg_allocator.free_temp(right_temp)
-            self.reg_allocator.free_temp(zero_reg)
-            self.reg_allocator.free_temp(temp_cmp)
-            self.reg_allocator.free_temp(one_reg)
-            self.reg_allocator.free_temp(zero_reg2)
-        elif op.op == '%':
-            # Modulo: use repeated subtraction, return remainder
-            # Copy operands to temporary registers to avoid modifying originals
-            remainder_reg = self.reg_allocator.get_temp_register()
-            right_temp = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(remainder_reg)}, {self.get_register_name(left_reg)}")
-            self.emit(f"mov {self.get_register_name(right_temp)}, {self.get_register_name(right_reg)}")
-            
-            loop_label = self.generate_label("mod_loop")
-            end_label = self.generate_label("mod_end")
-            
-            # Check for modulo by zero
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            error_label = self.generate_label("mod_error")
-            self.emit(f"cmovz r:31, {self.get_register_name(right_temp)}, {error_label} addr")
-            
-            self.emit_label(loop_label)
-            # Check if remainder_reg < right_temp, if so exit
-            # cmpb returns -1 if remainder < right, 0 if remainder >= right
-            temp_cmp = self.reg_allocator.get_temp_register()
-            self.emit(f"cmpb {self.get_register_name(temp_cmp)}, {self.get_register_name(remainder_reg)}, {self.get_register_name(right_temp)}")
-            # If temp_cmp != 0 (i.e., == -1, meaning remainder < right), jump to end
-            zero_reg2 = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg2)}, 0")
-            self.emit(f"cmovnz r:31, {self.get_register_name(temp_cmp)}, {end_label} addr")
-            
-            # Subtract right_temp from remainder_reg
-            self.emit(f"sub {self.get_register_name(remainder_reg)}, {self.get_register_name(remainder_reg)}, {self.get_register_name(right_temp)}")
-            
-            # Jump back to loop
-            self.emit(f"mov r:31, {loop_label} addr")
-            self.emit_label(end_label)
-            
-            # Move remainder to result
-            self.emit(f"mov {self.get_register_name(result_reg)}, {self.get_register_name(remainder_reg)}")
-            
-            # Jump over error label to avoid executing it
-            skip_error_label = self.generate_label("mod_skip_error")
-            self.emit(f"mov r:31, {skip_error_label} addr")
-            
-            # Error label (modulo by zero)
-            self.emit_label(error_label)
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-            
-            self.emit_label(skip_error_label)
-            
-            self.reg_allocator.free_temp(zero_reg2)
-            
-            self.reg_allocator.free_temp(remainder_reg)
-            self.reg_allocator.free_temp(right_temp)
-            self.reg_allocator.free_temp(zero_reg)
-            self.reg_allocator.free_temp(temp_cmp)
-            self.reg_allocator.free_temp(zero_reg2)
-        elif op.op == '==':
-            # Equality comparison: use cmpe
-            # Check if result_reg conflicts with left_reg or right_reg
-            if result_reg == left_reg or result_reg == right_reg:
-                temp_cmp = self.reg_allocator.get_temp_register()
-                self.emit(f"cmpe {self.get_register_name(temp_cmp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # Convert -1 (equal) to 1, 0 (not equal) to 0
-                temp = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(temp)}, -1")
-                self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(temp_cmp)}, {self.get_register_name(temp)}")
-                self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.reg_allocator.free_temp(temp)
-                self.reg_allocator.free_temp(temp_cmp)
-            else:
-                self.emit(f"cmpe {self.get_register_name(result_reg)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # Convert -1 (equal) to 1, 0 (not equal) to 0
-                temp = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(temp)}, -1")
-                self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.reg_allocator.free_temp(temp)
-        elif op.op == '!=':
-            # Not equal: use cmpe and invert
-            # Check if result_reg conflicts with left_reg or right_reg
-            if result_reg == left_reg or result_reg == right_reg:
-                temp_cmp = self.reg_allocator.get_temp_register()
-                self.emit(f"cmpe {self.get_register_name(temp_cmp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # Convert 0 (equal) to 0, -1 (not equal) to 1
-                temp = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(temp)}, -1")
-                self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(temp_cmp)}, {self.get_register_name(temp)}")
-                self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.reg_allocator.free_temp(temp)
-                self.reg_allocator.free_temp(temp_cmp)
-            else:
-                self.emit(f"cmpe {self.get_register_name(result_reg)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # Convert 0 (equal) to 0, -1 (not equal) to 1
-                temp = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(temp)}, -1")
-                self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.reg_allocator.free_temp(temp)
-        elif op.op == '<':
-            # Less than: use cmpb
-            # Check if result_reg conflicts with left_reg or right_reg
-            if result_reg == left_reg or result_reg == right_reg:
-                temp_cmp = self.reg_allocator.get_temp_register()
-                self.emit(f"cmpb {self.get_register_name(temp_cmp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # Convert -1 (less) to 1, 0 (not less) to 0
-                # BUG FIX: cmpb returns -1 if left < right, else 0
-                # We want: 1 if left < right, else 0
-                # So: if temp_cmp != 0 (i.e., == -1), set result_reg = 1, else set result_reg = 0
-                one_reg = self.reg_allocator.get_temp_register()
-                while one_reg == result_reg or one_reg == temp_cmp:
-                    self.reg_allocator.free_temp(one_reg)
-                    one_reg = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(result_reg)}, 0")  # Initialize to 0
-                self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-                # If temp_cmp != 0 (i.e., == -1, meaning left < right), set result_reg = 1
-                self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(temp_cmp)}, {self.get_register_name(one_reg)}")
-                self.reg_allocator.free_temp(one_reg)
-                self.reg_allocator.free_temp(temp_cmp)
-            else:
-                self.emit(f"cmpb {self.get_register_name(result_reg)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # Convert -1 (less) to 1, 0 (not less) to 0
-                # BUG FIX: cmpb returns -1 if left < right, else 0
-                # We want: 1 if left < right, else 0
-                # So: if result_reg != 0 (i.e., == -1), set result_reg = 1, else keep result_reg = 0
-                temp = self.reg_allocator.get_temp_register()
-                while temp == result_reg:
-                    self.reg_allocator.free_temp(temp)
-                    temp = self.reg_allocator.get_temp_register()
-                one_reg = self.reg_allocator.get_temp_register()
-                while one_reg == result_reg or one_reg == temp:
-                    self.reg_allocator.free_temp(one_reg)
-                    one_reg = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-                # If result_reg != 0 (i.e., == -1, meaning left < right), set result_reg = 1
-                self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(one_reg)}")
-                self.reg_allocator.free_temp(temp)
-                self.reg_allocator.free_temp(one_reg)
-        elif op.op == '>':
-            # Greater than: use cmpa
-            # Check if result_reg conflicts with left_reg or right_reg
-            if result_reg == left_reg or result_reg == right_reg:
-                temp_cmp = self.reg_allocator.get_temp_register()
-                self.emit(f"cmpa {self.get_register_name(temp_cmp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                temp = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(temp)}, -1")
-                self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(temp_cmp)}, {self.get_register_name(temp)}")
-                self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.reg_allocator.free_temp(temp)
-                self.reg_allocator.free_temp(temp_cmp)
-            else:
-                self.emit(f"cmpa {self.get_register_name(result_reg)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                temp = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(temp)}, -1")
-                self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-                self.reg_allocator.free_temp(temp)
-        elif op.op == '<=':
-            # Less than or equal: (a <= b) means !(a > b)
-            # Use cmpa to check if a > b, then invert
-            temp = self.reg_allocator.get_temp_register()
-            self.emit(f"cmpa {self.get_register_name(temp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-            # temp is -1 if a > b, 0 if a <= b
-            # We want result_reg = 1 if a <= b, 0 if a > b
-            # So: result_reg = 1 if temp == 0, else 0
-            one_reg = self.reg_allocator.get_temp_register()
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            # If temp == 0 (a <= b), set result_reg = 1, else 0
-            self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(temp)}, {self.get_register_name(one_reg)}")
-            self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(temp)}, {self.get_register_name(zero_reg)}")
-            self.reg_allocator.free_temp(temp)
-            self.reg_allocator.free_temp(one_reg)
-            self.reg_allocator.free_temp(zero_reg)
-        elif op.op == '>=':
-            # Greater than or equal: (a >= b) == (a > b) || (a == b)
-            # Use cmpa to check if a > b: if true, result = 1; if false, check if a == b
-            # Check if result_reg conflicts with left_reg or right_reg
-            if result_reg == left_reg or result_reg == right_reg:
-                temp_cmp = self.reg_allocator.get_temp_register()
-                while temp_cmp == left_reg or temp_cmp == right_reg:
-                    self.reg_allocator.free_temp(temp_cmp)
-                    temp_cmp = self.reg_allocator.get_temp_register()
-                # For a >= b: use cmpb to check a < b, then invert
-                # cmpb returns -1 if a < b, 0 if a >= b
-                self.emit(f"cmpb {self.get_register_name(temp_cmp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # temp_cmp is -1 if a < b, 0 if a >= b
-                # We want result_reg = 1 if a >= b, 0 if a < b
-                # So: result_reg = 1 if temp_cmp == 0, else 0
-                one_reg = self.reg_allocator.get_temp_register()
-                while one_reg == left_reg or one_reg == right_reg or one_reg == result_reg or one_reg == temp_cmp:
-                    self.reg_allocator.free_temp(one_reg)
-                    one_reg = self.reg_allocator.get_temp_register()
-                # Initialize result_reg to 0 first, then set to 1 if condition is true
-                self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-                self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-                # If temp_cmp == 0 (a >= b), set result_reg = 1
-                self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(temp_cmp)}, {self.get_register_name(one_reg)}")
-                self.reg_allocator.free_temp(temp_cmp)
-                self.reg_allocator.free_temp(one_reg)
-            else:
-                # For a >= b: use cmpb to check a < b, then invert
-                # cmpb returns -1 if a < b, 0 if a >= b
-                temp = self.reg_allocator.get_temp_register()
-                while temp == left_reg or temp == right_reg:
-                    self.reg_allocator.free_temp(temp)
-                    temp = self.reg_allocator.get_temp_register()
-                self.emit(f"cmpb {self.get_register_name(temp)}, {self.get_register_name(left_reg)}, {self.get_register_name(right_reg)}")
-                # temp is -1 if a < b, 0 if a >= b
-                # We want result_reg = 1 if a >= b, 0 if a < b
-                # So: result_reg = 1 if temp == 0, else 0
-                one_reg = self.reg_allocator.get_temp_register()
-                while one_reg == left_reg or one_reg == right_reg or one_reg == result_reg or one_reg == temp:
-                    self.reg_allocator.free_temp(one_reg)
-                    one_reg = self.reg_allocator.get_temp_register()
-                # Initialize result_reg to 0 first, then set to 1 if condition is true
-                self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-                self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-                # If temp == 0 (a >= b), set result_reg = 1
-                self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(temp)}, {self.get_register_name(one_reg)}")
-                self.reg_allocator.free_temp(temp)
-                self.reg_allocator.free_temp(one_reg)
-        elif op.op == '&&':
-            # Logical AND: both non-zero
-            # result = 1 if (left != 0) && (right != 0), else 0
-            # Simple approach: if left == 0, result = 0; else if right == 0, result = 0; else result = 1
-            zero_reg = self.reg_allocator.get_temp_register()
-            while zero_reg == left_reg or zero_reg == right_reg or zero_reg == result_reg:
-                self.reg_allocator.free_temp(zero_reg)
-                zero_reg = self.reg_allocator.get_temp_register()
-            
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
-            
-            # Check if left == 0, if so jump to end (result = 0)
-            end_label = self.generate_label("and_end")
-            temp_cmp = self.reg_allocator.get_temp_register()
-            while temp_cmp == left_reg or temp_cmp == right_reg or temp_cmp == result_reg or temp_cmp == zero_reg:
-                self.reg_allocator.free_temp(temp_cmp)
-                temp_cmp = self.reg_allocator.get_temp_register()
-            self.emit(f"cmpe {self.get_register_name(temp_cmp)}, {self.get_register_name(left_reg)}, {self.get_register_name(zero_reg)}")
-            # temp_cmp is -1 if left == 0, 0 if left != 0
-            # If left == 0 (temp_cmp == -1), jump to end using cmovnz (checks for -1)
-            self.emit(f"cmovnz r:31, {self.get_register_name(temp_cmp)}, {end_label} addr")
-            
-            # Check if right == 0, if so jump to end (result = 0)
-            temp_cmp2 = self.reg_allocator.get_temp_register()
-            while temp_cmp2 == left_reg or temp_cmp2 == right_reg or temp_cmp2 == result_reg or temp_cmp2 == zero_reg or temp_cmp2 == temp_cmp:
-                self.reg_allocator.free_temp(temp_cmp2)
-                temp_cmp2 = self.reg_allocator.get_temp_register()
-            self.emit(f"cmpe {self.get_register_name(temp_cmp2)}, {self.get_register_name(right_reg)}, {self.get_register_name(zero_reg)}")
-            # If right == 0 (temp_cmp2 == -1), jump to end using cmovnz (checks for -1)
-            self.emit(f"cmovnz r:31, {self.get_register_name(temp_cmp2)}, {end_label} addr")
-            
-            # Both are non-zero, set result to 1
-            one_reg = self.reg_allocator.get_temp_register()
-            while one_reg == left_reg or one_reg == right_reg or one_reg == result_reg or one_reg == zero_reg or one_reg == temp_cmp or one_reg == temp_cmp2:
-                self.reg_allocator.free_temp(one_reg)
-                one_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-            self.emit(f"mov {self.get_register_name(result_reg)}, 1")
-            # Jump to end to avoid falling through
-            self.emit(f"mov r:31, {end_label} addr")
-            
-            self.emit_label(end_label)
+        free_temp(left_temp)
+        free_temp(right_temp)
+        free_temp(bit_reg)
+    
+    def _emit_divide(self, op: BinaryOp, result_reg: int, left_reg: int, right_reg: int) -> None:
+        """Division and modulo: shift-subtract restoring divider (32 iterations)."""
+        rn = _REG_NAMES
+        prefix = "div" if op.op == '/' else "mod"
+        # The divider clobbers the dividend, so work on a copy
+        left_temp = self.reg_allocator.get_temp_register()
+        self.emit(f"mov {rn[left_temp]}, {rn[left_reg]}")
+        other_reg = self.reg_allocator.get_temp_register()
+        if op.op == '/':
+            quotient_reg, remainder_reg = result_reg, other_reg
+        else:
+            quotient_reg, remainder_reg = other_reg, result_reg
+        
+        self._emit_divide_loop(left_temp, right_reg, quotient_reg, remainder_reg, prefix)
+        # Division by zero gives 0. The loop itself is harmless for a zero
+        # divisor, so the result is simply replaced afterwards instead of
+        # branching around the loop.
+        if not self._is_nonzero(op.right):
+            self.emit(f"cmovz {rn[result_reg]}, {rn[right_reg]}, 0")
+        
+        self.reg_allocator.free_temp(left_temp)
+        self.reg_allocator.free_temp(other_reg)
+    
+    def _emit_comparison(self, op: BinaryOp, result_reg: int, left_reg: int, right_reg: int) -> None:
+        """Comparison producing 1 (true) or 0 (false).
+        
+        cmpa/cmpb/cmpe give -1 (all ones) for true and 0 for false.
+        A direct test keeps bit 0 (-1 -> 1); a negated one adds 1
+        (-1 -> 0, 0 -> 1): a != b is !(a == b), a <= b is !(a > b)
+        and a >= b is !(a < b).
+        """
+        rn = _REG_NAMES
+        instruction, fixup = _COMPARISON_OPS[op.op]
+        self.emit(f"{instruction} {rn[result_reg]}, {rn[left_reg]}, {rn[right_reg]}")
+        self.emit(f"{fixup} {rn[result_reg]}, {rn[result_reg]}, 1")
+    
+    def _emit_logical_and(self, op: BinaryOp, result_reg: int, left_reg: int, right_reg: int) -> None:
+        """Logical AND without branches: a zero operand gives a -1 mask,
+        so (left == 0 | right == 0) + 1 is 0 if either is 0, else 1."""
+        rn = _REG_NAMES
+        temp = self.reg_allocator.get_temp_register()
+        self.emit(f"cmpe {rn[result_reg]}, {rn[left_reg]}, 0")
+        self.emit(f"cmpe {rn[temp]}, {rn[right_reg]}, 0")
+        self.emit(f"or {rn[result_reg]}, {rn[result_reg]}, {rn[temp]}")
+        self.emit(f"add {rn[result_reg]}, {rn[result_reg]}, 1")
+        self.reg_allocator.free_temp(temp)
+    
+    def _emit_logical_or(self, op: BinaryOp, result_reg: int, left_reg: int, right_reg: int) -> None:
+        """Logical OR without branches: (left | right) == 0 gives -1 if
+        both are 0, and adding 1 turns that into 0 (else 1)."""
+        rn = _REG_NAMES
+        self.emit(f"or {rn[result_reg]}, {rn[left_reg]}, {rn[right_reg]}")
+        self.emit(f"cmpe {rn[result_reg]}, {rn[result_reg]}, 0")
+        self.emit(f"add {rn[result_reg]}, {rn[result_reg]}, 1")
+    
+    def fold_constant(self, expr: Expression) -> Optional[int]:
+        """Evaluate an expression made only of literals at compile time.
+        
+        Args:
+            expr: Expression to evaluate
             
-            self.reg_allocator.free_temp(zero_reg)
-            self.reg_allocator.free_temp(one_reg)
-            self.reg_allocator.free_temp(temp_cmp)
-            self.reg_allocator.free_temp(temp_cmp2)
-        elif op.op == '||':
-            # Logical OR: either non-zero
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            self.emit(f"cmpe {self.get_register_name(result_reg)}, {self.get_register_name(left_reg)}, {self.get_register_name(zero_reg)}")
-            temp = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(temp)}, 1")
-            self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-            self.emit(f"cmpe {self.get_register_name(temp)}, {self.get_register_name(right_reg)}, {self.get_register_name(zero_reg)}")
-            self.emit(f"cmovnz {self.get_register_name(result_reg)}, {self.get_register_name(temp)}, {self.get_register_name(result_reg)}")
-            self.reg_allocator.free_temp(temp)
-            self.reg_allocator.free_temp(zero_reg)
+        Returns:
+            32-bit unsigned value, or None if the expression is not constant
+        """
+        if isinstance(expr, Literal):
+            return expr.value & _MASK32
+        if isinstance(expr, BinaryOp) and expr.op in _CONSTANT_BINARY_OPS:
+            left = self.fold_constant(expr.left)
+            if left is None:
+                return None
+            right = self.fold_constant(expr.right)
+            if right is None:
+                return None
+            return _CONSTANT_BINARY_OPS[expr.op](left, right)
+        if isinstance(expr, UnaryOp) and expr.op in _CONSTANT_UNARY_OPS:
+            operand = self.fold_constant(expr.operand)
+            if operand is None:
+                return None
+            return _CONSTANT_UNARY_OPS[expr.op](operand)
+        return None
+    
+    def _is_nonzero(self, expr: Expression) -> bool:
+        """Check whether an expression can never evaluate to 0 (a non-zero
+        constant, or an '|' with such an operand)."""
+        value = self.fold_constant(expr)
+        if value is not None:
+            return value != 0
+        if isinstance(expr, BinaryOp) and expr.op == '|':
+            return self._is_nonzero(expr.left) or self._is_nonzero(expr.right)
+        return False
+    
+    def _has_side_effects(self, expr: Expression) -> bool:
+        """Check whether evaluating an expression may call a function."""
+        if isinstance(expr, FunctionCall):
+            return True
+        if isinstance(expr, BinaryOp):
+            return self._has_side_effects(expr.left) or self._has_side_effects(expr.right)
+        if isinstance(expr, (UnaryOp, AddressOf, Dereference)):
+            return self._has_side_effects(expr.operand)
+        if isinstance(expr, ArrayAccess):
+            return self._has_side_effects(expr.index)
+        return False
+    
+    def _generate_identity(self, op: BinaryOp) -> Optional[int]:
+        """Generate code for a binary operation with one constant operand
+        when an algebraic identity makes it cheaper.
+        
+        Returns:
+            Register number containing the result, or None if no identity applies
+        """
+        right_value = self.fold_constant(op.right)
+        if right_value is not None:
+            operand, value = op.left, right_value
+        elif op.op in _COMMUTATIVE_OPS:
+            value = self.fold_constant(op.left)
+            if value is None:
+                return None
+            operand = op.right
         else:
-            raise RuntimeError(f"Code generation error: Unknown binary operator '{op.op}' in function '{self.current_function}'")
+            return None
+        
+        # x + 0, x - 0, x | 0, x ^ 0, x << 0, x >> 0, x * 1, x / 1
+        if (value == 0 and op.op in ('+', '-', '|', '^', '<<', '>>')) or (value == 1 and op.op in ('*', '/')):
+            return self.generate_expression(operand)
+        
+        # x * 0, x & 0 (still evaluate x if it calls a function)
+        if value == 0 and op.op in ('*', '&'):
+            if self._has_side_effects(operand):
+                self.reg_allocator.free_temp(self.generate_expression(operand))
+            return self.generate_literal(Literal(0))
+        
+        # x % 1, x / 0, x % 0 (still evaluate x if it calls a function;
+        # division by zero gives 0, as in the runtime divider)
+        if op.op in ('/', '%') and value in (0, 1):
+            if self._has_side_effects(operand):
+                self.reg_allocator.free_temp(self.generate_expression(operand))
+            return self.generate_literal(Literal(0))
+        
+        # x % 2^k -> and with 2^k - 1 (unsigned)
+        if op.op == '%' and value & (value - 1) == 0 and value != 0:
+            operand_reg = self.generate_expression(operand)
+            if value - 1 <= MAX_IMMEDIATE3:
+                mask_reg, mask = None, str(value - 1)
+            else:
+                mask_reg = self.generate_literal(Literal(value - 1))
+                mask = _REG_NAMES[mask_reg]
+            result_reg = self.reg_allocator.get_temp_register()
+            self.emit(f"and {_REG_NAMES[result_reg]}, {_REG_NAMES[operand_reg]}, {mask}")
+            if mask_reg is not None:
+                self.reg_allocator.free_temp(mask_reg)
+            self.reg_allocator.free_temp(operand_reg)
+            return result_reg
         
-        self.reg_allocator.free_temp(left_reg)
-        self.reg_allocator.free_temp(right_reg)
-        return result_reg
+        # x * 2^k -> shl, x / 2^k -> shr (unsigned)
+        if op.op in ('*', '/') and value & (value - 1) == 0 and value != 0:
+            operand_reg = self.generate_expression(operand)
+            result_reg = self.reg_allocator.get_temp_register()
+            instruction = "shl" if op.op == '*' else "shr"
+            self.emit(f"{instruction} {_REG_NAMES[result_reg]}, {_REG_NAMES[operand_reg]}, {value.bit_length() - 1}")
+            self.reg_allocator.free_temp(operand_reg)
+            return result_reg
+        
+        return None
+    
+    def _emit_divide_loop(self, dividend_reg: int, divisor_reg: int, quotient_reg: int, remainder_reg: int, prefix: str) -> None:
+        """Emit a 32-iteration unsigned shift-subtract (restoring) divider.
+        
+        Args:
+            dividend_reg: Register with the dividend (clobbered)
+            divisor_reg: Register with the non-zero divisor (preserved)
+            quotient_reg: Register receiving the quotient
+            remainder_reg: Register receiving the remainder
+            prefix: Label prefix ("div" or "mod")
+        
+        Each iteration shifts the next dividend bit into the partial remainder
+        and subtracts the divisor when it fits, so the cost is bounded by the
+        word size instead of the value of the quotient.
+        """
+        loop_label = self.generate_label(f"{prefix}_loop")
+        skip_label = self.generate_label(f"{prefix}_skip")
+        end_label = self.generate_label(f"{prefix}_end")
+        
+        count_reg = self.reg_allocator.get_temp_register()
+        top_reg = self.reg_allocator.get_temp_register()
+        bit_reg = self.reg_allocator.get_temp_register()
+        self.emit(f"mov {_REG_NAMES[quotient_reg]}, 0")
+        self.emit(f"mov {_REG_NAMES[remainder_reg]}, 0")
+        self.emit(f"mov {_REG_NAMES[count_reg]}, 32")
+        
+        self.emit_label(loop_label)
+        # top_reg = 0 if shifting the remainder overflows 32 bits (then it is
+        # certainly >= divisor), -1 otherwise: the top bit minus 1. (An
+        # immediate sar can't be used: its shift-type flag overlaps the
+        # 15-bit immediate field.)
+        self.emit(f"shr {_REG_NAMES[top_reg]}, {_REG_NAMES[remainder_reg]}, 31")
+        self.emit(f"sub {_REG_NAMES[top_reg]}, {_REG_NAMES[top_reg]}, 1")
+        # remainder = (remainder << 1) | (dividend >> 31); dividend <<= 1
+        self.emit(f"shl {_REG_NAMES[remainder_reg]}, {_REG_NAMES[remainder_reg]}, 1")
+        self.emit(f"shr {_REG_NAMES[bit_reg]}, {_REG_NAMES[dividend_reg]}, 31")
+        self.emit(f"or {_REG_NAMES[remainder_reg]}, {_REG_NAMES[remainder_reg]}, {_REG_NAMES[bit_reg]}")
+        self.emit(f"shl {_REG_NAMES[dividend_reg]}, {_REG_NAMES[dividend_reg]}, 1")
+        self.emit(f"shl {_REG_NAMES[quotient_reg]}, {_REG_NAMES[quotient_reg]}, 1")
+        # bit_reg = -1 if remainder < divisor and there was no overflow
+        self.emit(f"cmpb {_REG_NAMES[bit_reg]}, {_REG_NAMES[remainder_reg]}, {_REG_NAMES[divisor_reg]}")
+        self.emit(f"and {_REG_NAMES[bit_reg]}, {_REG_NAMES[bit_reg]}, {_REG_NAMES[top_reg]}")
+        self.emit(f"cmovnz r:31, {_REG_NAMES[bit_reg]}, {skip_label} addr")
+        # Divisor fits: subtract it and set the quotient bit
+        self.emit(f"sub {_REG_NAMES[remainder_reg]}, {_REG_NAMES[remainder_reg]}, {_REG_NAMES[divisor_reg]}")
+        self.emit(f"or {_REG_NAMES[quotient_reg]}, {_REG_NAMES[quotient_reg]}, 1")
+        self.emit_label(skip_label)
+        
+        self.emit(f"sub {_REG_NAMES[count_reg]}, {_REG_NAMES[count_reg]}, 1")
+        self.emit(f"cmovz r:31, {_REG_NAMES[count_reg]}, {end_label} addr")
+        self.emit(f"mov r:31, {loop_label} addr")
+        self.emit_label(end_label)
+        
+        self.reg_allocator.free_temp(count_reg)
+        self.reg_allocator.free_temp(top_reg)
+        self.reg_allocator.free_temp(bit_reg)
     
     def generate_unary_op(self, op: UnaryOp) -> int:
         """Generate code for unary operation.
@@ -961,30 +1271,41 @@ class CodeGenerator:
             
         Supported operators: !, ~, - (unary minus)
         """
+        value = self.fold_constant(op)
+        if value is not None:
+            return self.generate_literal(Literal(value))
+        
+        # !(a < b) is a >= b etc.: the complementary comparison costs the
+        # same two instructions as the original, so the ! itself is free
+        inner = op.operand
+        if op.op == '!' and isinstance(inner, BinaryOp) and inner.op in _NEGATED_COMPARISONS:
+            return self.generate_binary_op(BinaryOp(_NEGATED_COMPARISONS[inner.op], inner.left, inner.right))
+        
+        # --x and ~~x are x; -~x is x + 1 and ~-x is x - 1
+        if isinstance(inner, UnaryOp) and op.op in ('-', '~') and inner.op in ('-', '~'):
+            if inner.op == op.op:
+                return self.generate_expression(inner.operand)
+            operand_reg = self.generate_expression(inner.operand)
+            result_reg = self.reg_allocator.get_temp_register()
+            instruction = "add" if op.op == '-' else "sub"
+            self.emit(f"{instruction} {_REG_NAMES[result_reg]}, {_REG_NAMES[operand_reg]}, 1")
+            self.reg_allocator.free_temp(operand_reg)
+            return result_reg
+        
         operand_reg = self.generate_expression(op.operand)
         result_reg = self.reg_allocator.get_temp_register()
         
         if op.op == '!':
-            # Logical NOT: convert 0 to 1, non-zero to 0
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            self.emit(f"cmpe {self.get_register_name(result_reg)}, {self.get_register_name(operand_reg)}, {self.get_register_name(zero_reg)}")
-            # result_reg is -1 if equal (operand was 0), 0 if not equal
-            # Convert -1 to 1, 0 to 0
-            temp = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(temp)}, -1")
-            self.emit(f"cmovz {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-            self.emit(f"xor {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(temp)}")
-            self.reg_allocator.free_temp(temp)
-            self.reg_allocator.free_temp(zero_reg)
+            # Logical NOT: cmpe gives -1 if the operand is 0, else 0; keep bit 0
+            self.emit(f"cmpe {_REG_NAMES[result_reg]}, {_REG_NAMES[operand_reg]}, 0")
+            self.emit(f"and {_REG_NAMES[result_reg]}, {_REG_NAMES[result_reg]}, 1")
         elif op.op == '~':
             # Bitwise NOT
-            self.emit(f"not {self.get_register_name(result_reg)}, {self.get_register_name(operand_reg)}")
+            self.emit(f"not {_REG_NAMES[result_reg]}, {_REG_NAMES[operand_reg]}")
         elif op.op == '-':
-            # Unary minus: 0 - operand
-            zero_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-            self.emit(f"sub {self.get_register_name(result_reg)}, {self.get_register_name(zero_reg)}, {self.get_register_name(operand_reg)}")
+            # Unary minus: 0 - operand (the ISA has no neg instruction)
+            zero_reg = self._get_const_reg(0)
+            self.emit(f"sub {_REG_NAMES[result_reg]}, {_REG_NAMES[zero_reg]}, {_REG_NAMES[operand_reg]}")
             self.reg_allocator.free_temp(zero_reg)
         else:
             raise RuntimeError(f"Code generation error: Unknown unary operator '{op.op}' in function '{self.current_function}'")
@@ -1002,7 +1323,8 @@ class CodeGenerator:
             Register number containing the return value (r:0 after function call)
             
         Note:
-            Parameters are passed in registers r26-r30 (max 5 parameters).
+            The first ARGUMENT_REGISTERS arguments are passed in r:1, r:2, ...;
+            further arguments are pushed onto the stack.
             Return value is expected in r:0.
             Return address is pushed onto stack (r:30 is stack pointer).
         """
@@ -1010,28 +1332,50 @@ class CodeGenerator:
         if call.name not in self.function_labels:
             return self.generate_hardware_function(call)
         
-        # Pass parameters through stack (in reverse order: last parameter first)
-        # This way first parameter will be on top of stack
-        temp_reg = self.reg_allocator.get_temp_register()
-        for i in range(len(call.args) - 1, -1, -1):  # Reverse order
-            arg = call.args[i]
-            arg_reg = self.generate_expression(arg)
-            # Push parameter onto stack
-            if arg_reg != temp_reg:
-                self.emit(f"mov {self.get_register_name(temp_reg)}, {self.get_register_name(arg_reg)}")
-            self.emit(f"sub r:30, r:30, 1")  # Decrement stack pointer
-            self.emit(f"lds [r:30], {self.get_register_name(temp_reg)}")  # Push parameter onto stack
+        # Evaluate all arguments first: moving one into its argument register
+        # could otherwise clobber a temporary still needed by the next one.
+        # A nested call clobbers registers too, so values already evaluated
+        # are pushed before an argument containing a call and popped after
+        # the last argument.
+        arg_regs: List[Optional[int]] = []
+        spilled: List[int] = []
+        for arg in call.args:
+            if self._has_side_effects(arg):
+                for index, arg_reg in enumerate(arg_regs):
+                    if arg_reg is not None:
+                        self.emit("sub r:30, r:30, 1")
+                        self.emit(f"lds [r:30], {_REG_NAMES[arg_reg]}")
+                        self.reg_allocator.free_temp(arg_reg)
+                        arg_regs[index] = None
+                        spilled.append(index)
+            arg_regs.append(self.generate_expression(arg))
+        for index in reversed(spilled):
+            arg_reg = self.reg_allocator.get_temp_register()
+            self.emit(f"lds {_REG_NAMES[arg_reg]}, [r:30]")
+            self.emit("add r:30, r:30, 1")
+            arg_regs[index] = arg_reg
+        
+        # Arguments beyond the register ones go through the stack (in
+        # reverse order: last parameter first), so the first stack parameter
+        # ends up next to the return address
+        stack_args = arg_regs[ARGUMENT_REGISTERS:]
+        for arg_reg in reversed(stack_args):
+            self.emit("sub r:30, r:30, 1")  # Decrement stack pointer
+            self.emit(f"lds [r:30], {_REG_NAMES[arg_reg]}")  # Push parameter onto stack
+        
+        self._emit_parallel_move({i + 1: arg_reg for i, arg_reg in enumerate(arg_regs[:ARGUMENT_REGISTERS])})
+        for arg_reg in reversed(arg_regs):
             self.reg_allocator.free_temp(arg_reg)
         
         # Generate return address label
         return_addr_label = self.generate_label("ret_addr")
         
-        # Push return address onto stack: decrement r:30 (stack pointer), then store return address
-        # r:30 is the stack pointer (initialized to 4096 by entry macro)
-        self.emit(f"mov {self.get_register_name(temp_reg)}, {return_addr_label} addr")  # Get return address
-        self.emit(f"sub r:30, r:30, 1")  # Decrement stack pointer
-        self.emit(f"lds [r:30], {self.get_register_name(temp_reg)}")  # Push return address onto stack
-        self.reg_allocator.free_temp(temp_reg)
+        # Push return address onto stack: decrement r:30 (stack pointer), then
+        # store return address. r:29 is free here and, unlike a temporary,
+        # cannot hold an argument
+        self.emit(f"mov r:29, {return_addr_label} addr")  # Get return address
+        self.emit("sub r:30, r:30, 1")  # Decrement stack pointer
+        self.emit("lds [r:30], r:29")  # Push return address onto stack
         
         # Jump to function by setting r:31 (instruction pointer) to function label
         func_label = self.function_labels[call.name]
@@ -1040,23 +1384,42 @@ class CodeGenerator:
         # Return address label - execution continues here after function returns
         self.emit_label(return_addr_label)
         
-        # Clean up parameters from stack (they were pushed before return address)
-        # Stack layout: [param0][param1]...[paramN][return_addr] (r:30 points to return_addr after return)
-        # We need to pop parameters: add r:30, r:30, num_params
-        if len(call.args) > 0:
-            cleanup_reg = self.reg_allocator.get_temp_register()
-            self.emit(f"mov {self.get_register_name(cleanup_reg)}, {len(call.args)}")
-            self.emit(f"add r:30, r:30, {self.get_register_name(cleanup_reg)}")  # Pop parameters from stack
-            self.reg_allocator.free_temp(cleanup_reg)
+        # Pop stack parameters (they were pushed before return address)
+        if stack_args:
+            self.emit(f"add r:30, r:30, {len(stack_args)}")
+        self._call_returns.append(len(self.code))
         
         # After function call, return value should be in r:0
         # Get return value
         result_reg = self.reg_allocator.get_temp_register()
         if result_reg != 0:
-            self.emit(f"mov {self.get_register_name(result_reg)}, r:0")
+            self.emit(f"mov {_REG_NAMES[result_reg]}, r:0")
         
         return result_reg
     
+    def _emit_parallel_move(self, moves: Dict[int, int]) -> None:
+        """Copy registers as if all moves happened at once.
+        
+        Args:
+            moves: Destination register -> source register
+        
+        A move is emitted only once no other pending move still reads its
+        destination; a cycle (r:1 <-> r:2) is broken through r:29.
+        """
+        rn = _REG_NAMES
+        pending = {dst: src for dst, src in moves.items() if dst != src}
+        while pending:
+            sources = set(pending.values())
+            ready = [dst for dst in pending if dst not in sources]
+            if ready:
+                for dst in ready:
+                    self.emit(f"mov {rn[dst]}, {rn[pending.pop(dst)]}")
+                continue
+            # Every destination is still needed: save one and read it from r:29
+            dst = next(iter(pending))
+            self.emit(f"mov r:29, {rn[dst]}")
+            pending = {d: (29 if src == dst else src) for d, src in pending.items()}
+    
     def generate_hardware_function(self, call: FunctionCall) -> int:
         """Generate code for hardware function calls.
         
@@ -1081,23 +1444,23 @@ class CodeGenerator:
             mode_reg = self.generate_expression(call.args[2])
             # Pack into one value: (pin << 16) | (dir << 8) | mode
             temp = self.reg_allocator.get_temp_register()
-            self.emit(f"shl {self.get_register_name(temp)}, {self.get_register_name(pin_reg)}, 16")
+            self.emit(f"shl {_REG_NAMES[temp]}, {_REG_NAMES[pin_reg]}, 16")
             temp2 = self.reg_allocator.get_temp_register()
-            self.emit(f"shl {self.get_register_name(temp2)}, {self.get_register_name(dir_reg)}, 8")
-            self.emit(f"or {self.get_register_name(temp)}, {self.get_register_name(temp)}, {self.get_register_name(temp2)}")
-            self.emit(f"or {self.get_register_name(temp)}, {self.get_register_name(temp)}, {self.get_register_name(mode_reg)}")
-            self.emit(f"setg {self.get_register_name(temp)}")
+            self.emit(f"shl {_REG_NAMES[temp2]}, {_REG_NAMES[dir_reg]}, 8")
+            self.emit(f"or {_REG_NAMES[temp]}, {_REG_NAMES[temp]}, {_REG_NAMES[temp2]}")
+            self.emit(f"or {_REG_NAMES[temp]}, {_REG_NAMES[temp]}, {_REG_NAMES[mode_reg]}")
+            self.emit(f"setg {_REG_NAMES[temp]}")
             self.reg_allocator.free_temp(pin_reg)
             self.reg_allocator.free_temp(dir_reg)
             self.reg_allocator.free_temp(mode_reg)
             self.reg_allocator.free_temp(temp)
             self.reg_allocator.free_temp(temp2)
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
+            self.emit(f"mov {_REG_NAMES[result_reg]}, 0")
         elif call.name == 'gpio_read':
             if len(call.args) != 1:
                 raise RuntimeError(f"gpio_read expects 1 argument, got {len(call.args)}")
             pin_reg = self.generate_expression(call.args[0])
-            self.emit(f"getg {self.get_register_name(result_reg)}")
+            self.emit(f"getg {_REG_NAMES[result_reg]}")
             self.reg_allocator.free_temp(pin_reg)
         elif call.name == 'gpio_write':
             if len(call.args) != 2:
@@ -1106,31 +1469,31 @@ class CodeGenerator:
             value_reg = self.generate_expression(call.args[1])
             # Pack: (pin << 8) | value
             temp = self.reg_allocator.get_temp_register()
-            self.emit(f"shl {self.get_register_name(temp)}, {self.get_register_name(pin_reg)}, 8")
-            self.emit(f"or {self.get_register_name(temp)}, {self.get_register_name(temp)}, {self.get_register_name(value_reg)}")
-            self.emit(f"outg {self.get_register_name(temp)}")
+            self.emit(f"shl {_REG_NAMES[temp]}, {_REG_NAMES[pin_reg]}, 8")
+            self.emit(f"or {_REG_NAMES[temp]}, {_REG_NAMES[temp]}, {_REG_NAMES[value_reg]}")
+            self.emit(f"outg {_REG_NAMES[temp]}")
             self.reg_allocator.free_temp(pin_reg)
             self.reg_allocator.free_temp(value_reg)
             self.reg_allocator.free_temp(temp)
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
+            self.emit(f"mov {_REG_NAMES[result_reg]}, 0")
         elif call.name == 'uart_set_baud':
             if len(call.args) != 1:
                 raise RuntimeError(f"uart_set_baud expects 1 argument, got {len(call.args)}")
             baud_reg = self.generate_expression(call.args[0])
-            self.emit(f"setu {self.get_register_name(baud_reg)}")
+            self.emit(f"setu {_REG_NAMES[baud_reg]}")
             self.reg_allocator.free_temp(baud_reg)
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
+            self.emit(f"mov {_REG_NAMES[result_reg]}, 0")
         elif call.name == 'uart_read':
             if len(call.args) != 0:
                 raise RuntimeError(f"uart_read expects 0 arguments, got {len(call.args)}")
-            self.emit(f"inu {self.get_register_name(result_reg)}")
+            self.emit(f"inu {_REG_NAMES[result_reg]}")
         elif call.name == 'uart_write':
             if len(call.args) != 1:
                 raise RuntimeError(f"uart_write expects 1 argument, got {len(call.args)}")
             data_reg = self.generate_expression(call.args[0])
-            self.emit(f"outu {self.get_register_name(data_reg)}")
+            self.emit(f"outu {_REG_NAMES[data_reg]}")
             self.reg_allocator.free_temp(data_reg)
-            self.emit(f"mov {self.get_register_name(result_reg)}, 0")
+            self.emit(f"mov {_REG_NAMES[result_reg]}, 0")
         else:
             raise RuntimeError(f"Code generation error: Unknown hardware function '{call.name}' in function '{self.current_function}'")
         
@@ -1145,7 +1508,7 @@ class CodeGenerator:
             value_reg = self.generate_expression(stmt.value)
             # Return value in r:0 by convention
             if value_reg != 0:
-                self.emit(f"mov r:0, {self.get_register_name(value_reg)}")
+                self.emit(f"mov r:0, {_REG_NAMES[value_reg]}")
             self.reg_allocator.free_temp(value_reg)
         else:
             self.emit("mov r:0, 0")
@@ -1164,25 +1527,110 @@ class CodeGenerator:
             # Return to caller by jumping to return address
             self.emit(f"mov r:31, r:29")
     
+    def _single_assignment(self, stmt: Optional[Statement]) -> Optional[Assignment]:
+        """Return the assignment if stmt is one (possibly braced) assignment."""
+        while isinstance(stmt, Block) and len(stmt.statements) == 1:
+            stmt = stmt.statements[0]
+        return stmt if isinstance(stmt, Assignment) else None
+    
+    def _is_simple_expression(self, expr: Expression) -> bool:
+        """Check whether an expression is cheap and side-effect free: literals,
+        variables and single-instruction operators on them."""
+        if isinstance(expr, (Literal, Identifier)):
+            return True
+        if isinstance(expr, BinaryOp) and expr.op in ('+', '-', '&', '|', '^', '<<', '>>'):
+            return self._is_simple_expression(expr.left) and self._is_simple_expression(expr.right)
+        if isinstance(expr, UnaryOp) and expr.op in ('-', '~'):
+            return self._is_simple_expression(expr.operand)
+        return False
+    
+    def _generate_conditional_move(self, stmt: IfStmt) -> bool:
+        """Generate a branchless if-else when possible.
+        
+        Recognized pattern: both branches are a single assignment to the same
+        local (register) variable and both right-hand sides are simple
+        expressions (see _is_simple_expression). Both values are computed
+        and the result is selected with cmovz:
+        
+            mov x, then_value
+            cmovz x, condition, else_value
+        
+        Returns:
+            True if code was generated, False if the pattern does not match
+        """
+        then_assign = self._single_assignment(stmt.then_stmt)
+        else_assign = self._single_assignment(stmt.else_stmt)
+        if then_assign is None or else_assign is None or then_assign.name != else_assign.name:
+            return False
+        info = self.symbols.get(then_assign.name)
+        target_reg = self.reg_allocator.get_register(then_assign.name)
+        if target_reg is None or (info is not None and info.is_global):
+            return False
+        if not (self._is_simple_expression(then_assign.value) and self._is_simple_expression(else_assign.value)):
+            return False
+        
+        rn = _REG_NAMES
+        condition_reg = self.generate_expression(stmt.condition)
+        then_reg = self.generate_expression(then_assign.value)
+        else_reg = self.generate_expression(else_assign.value)
+        if target_reg in (condition_reg, else_reg):
+            # The target is still read by cmovz: select into a temporary first
+            select_reg = self.reg_allocator.get_temp_register()
+        else:
+            select_reg = target_reg
+        if then_reg != select_reg:
+            self.emit(f"mov {rn[select_reg]}, {rn[then_reg]}")
+        self.emit(f"cmovz {rn[select_reg]}, {rn[condition_reg]}, {rn[else_reg]}")
+        if select_reg != target_reg:
+            self.emit(f"mov {rn[target_reg]}, {rn[select_reg]}")
+            self.reg_allocator.free_temp(select_reg)
+        self.reg_allocator.free_temp(condition_reg)
+        self.reg_allocator.free_temp(then_reg)
+        self.reg_allocator.free_temp(else_reg)
+        return True
+    
+    def _emit_jump_if_false(self, condition: Expression, label: str) -> None:
+        """Jump to label when condition evaluates to 0.
+        
+        A comparison jumps on the -1/0 mask of its compare instruction, so
+        the conversion to 1/0 is never emitted: cmovz when a zero mask
+        means false, cmovnz (taken only on all ones) when the comparison is
+        the negation of the instruction (!=, <=, >=).
+        """
+        if isinstance(condition, UnaryOp) and condition.op == '!' \
+                and isinstance(condition.operand, BinaryOp) and condition.operand.op in _NEGATED_COMPARISONS:
+            inner = condition.operand
+            condition = BinaryOp(_NEGATED_COMPARISONS[inner.op], inner.left, inner.right)
+        
+        rn = _REG_NAMES
+        if isinstance(condition, BinaryOp) and condition.op in _COMPARISON_OPS and self.fold_constant(condition) is None:
+            left_reg = self.generate_expression(condition.left)
+            right_reg = self.generate_expression(condition.right)
+            self.reg_allocator.free_temp(right_reg)
+            self.reg_allocator.free_temp(left_reg)
+            mask_reg = self.reg_allocator.get_temp_register()
+            instruction, fixup = _COMPARISON_OPS[condition.op]
+            self.emit(f"{instruction} {rn[mask_reg]}, {rn[left_reg]}, {rn[right_reg]}")
+            jump = "cmovz" if fixup == 'and' else "cmovnz"
+            self.emit(f"{jump} r:31, {rn[mask_reg]}, {label} addr")
+            self.reg_allocator.free_temp(mask_reg)
+            return
+        
+        # cmovz r:31, condition_reg, label addr: if condition_reg == 0, set r:31 to label address (jump)
+        condition_reg = self.generate_expression(condition)
+        self.emit(f"cmovz r:31, {rn[condition_reg]}, {label} addr")
+        self.reg_allocator.free_temp(condition_reg)
+    
     def generate_if(self, stmt: IfStmt) -> None:
         """Generate code for if statement."""
-        condition_reg = self.generate_expression(stmt.condition)
+        if stmt.else_stmt and self._generate_conditional_move(stmt):
+            return
+        
         else_label = self.generate_label("else")
         end_label = self.generate_label("endif")
         
-        # Test condition: if condition == 0 (false), jump to else/end
-        zero_reg = self.reg_allocator.get_temp_register()
-        self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-        
         # Conditional jump: if condition == 0 (false), jump to else/end
-        # cmovz r:31, condition_reg, label addr means: if condition_reg == 0, set r:31 to label address (jump)
-        if stmt.else_stmt:
-            self.emit(f"cmovz r:31, {self.get_register_name(condition_reg)}, {else_label} addr")
-        else:
-            self.emit(f"cmovz r:31, {self.get_register_name(condition_reg)}, {end_label} addr")
-        
-        self.reg_allocator.free_temp(zero_reg)
-        self.reg_allocator.free_temp(condition_reg)
+        self._emit_jump_if_false(stmt.condition, else_label if stmt.else_stmt else end_label)
         
         # Then branch
         self.generate_statement(stmt.then_stmt)
@@ -1207,30 +1655,21 @@ class CodeGenerator:
         loop_context = LoopContext(start_label, end_label, "while")
         self.loop_stack.append(loop_context)
         
-        try:
-            self.emit_label(start_label)
-            
-            # Evaluate condition
-            condition_reg = self.generate_expression(stmt.condition)
-            
-            # Conditional jump: if condition == 0 (false), exit loop
-            # cmovz r:31, condition_reg, end_label addr means: if condition_reg == 0, set r:31 to end_label address (jump)
-            self.emit(f"cmovz r:31, {self.get_register_name(condition_reg)}, {end_label} addr")
-            
-            if condition_reg != 10:
-                # Only free if we allocated it
-                self.reg_allocator.free_temp(condition_reg)
-            
-            # Loop body
-            self.generate_statement(stmt.body)
-            
-            # Unconditional jump back to start
-            self.emit(f"mov r:31, {start_label} addr")
-            
-            self.emit_label(end_label)
-        finally:
-            # Remove loop context from stack
-            self.loop_stack.pop()
+        self.emit_label(start_label)
+        
+        # Conditional jump: if condition == 0 (false), exit loop
+        self._emit_jump_if_false(stmt.condition, end_label)
+        
+        # Loop body
+        self.generate_statement(stmt.body)
+        
+        # Unconditional jump back to start
+        self.emit(f"mov r:31, {start_label} addr")
+        
+        self.emit_label(end_label)
+        
+        # Remove loop context from stack
+        self.loop_stack.pop()
 
     def generate_do_while(self, stmt: DoWhileStmt) -> None:
         """Generate code for do-while loop: body first, then condition."""
@@ -1239,18 +1678,13 @@ class CodeGenerator:
         end_label = self.generate_label("do_end")
         loop_context = LoopContext(start_label, end_label, "do_while", condition_label=condition_label)
         self.loop_stack.append(loop_context)
-        try:
-            self.emit_label(start_label)
-            self.generate_statement(stmt.body)
-            self.emit_label(condition_label)
-            condition_reg = self.generate_expression(stmt.condition)
-            self.emit(f"cmovz r:31, {self.get_register_name(condition_reg)}, {end_label} addr")
-            if condition_reg != 10:
-                self.reg_allocator.free_temp(condition_reg)
-            self.emit(f"mov r:31, {start_label} addr")
-            self.emit_label(end_label)
-        finally:
-            self.loop_stack.pop()
+        self.emit_label(start_label)
+        self.generate_statement(stmt.body)
+        self.emit_label(condition_label)
+        self._emit_jump_if_false(stmt.condition, end_label)
+        self.emit(f"mov r:31, {start_label} addr")
+        self.emit_label(end_label)
+        self.loop_stack.pop()
     
     def generate_for(self, stmt: ForStmt) -> None:
         """Generate code for for loop."""
@@ -1266,37 +1700,28 @@ class CodeGenerator:
         loop_context = LoopContext(start_label, end_label, "for", increment_label)
         self.loop_stack.append(loop_context)
         
-        try:
-            self.emit_label(start_label)
-            
-            # Condition check
-            if stmt.condition:
-                condition_reg = self.generate_expression(stmt.condition)
-                zero_reg = self.reg_allocator.get_temp_register()
-                self.emit(f"mov {self.get_register_name(zero_reg)}, 0")
-                
-                # Conditional jump: if condition == 0 (false), exit loop
-                # cmovz r:31, condition_reg, end_label addr means: if condition_reg == 0, set r:31 to end_label address (jump)
-                self.emit(f"cmovz r:31, {self.get_register_name(condition_reg)}, {end_label} addr")
-                
-                self.reg_allocator.free_temp(zero_reg)
-                self.reg_allocator.free_temp(condition_reg)
-            
-            # Loop body
-            self.generate_statement(stmt.body)
-            
-            # Increment section (with label for continue)
-            if stmt.increment:
-                self.emit_label(increment_label)
-                self.generate_statement(stmt.increment)
-            
-            # Unconditional jump back to start
-            self.emit(f"mov r:31, {start_label} addr")
-            
-            self.emit_label(end_label)
-        finally:
-            # Remove loop context from stack
-            self.loop_stack.pop()
+        self.emit_label(start_label)
+        
+        # Condition check
+        if stmt.condition:
+            # Conditional jump: if condition == 0 (false), exit loop
+            self._emit_jump_if_false(stmt.condition, end_label)
+        
+        # Loop body
+        self.generate_statement(stmt.body)
+        
+        # Increment section (with label for continue)
+        if stmt.increment:
+            self.emit_label(increment_label)
+            self.generate_statement(stmt.increment)
+        
+        # Unconditional jump back to start
+        self.emit(f"mov r:31, {start_label} addr")
+        
+        self.emit_label(end_label)
+        
+        # Remove loop context from stack
+        self.loop_stack.pop()
     
     def generate_block(self, block: Block) -> None:
         """Generate code for block."""
@@ -1341,25 +1766,13 @@ class CodeGenerator:
         if is_global:
             # Global array - allocate in data section
             label = f"array_{decl.name}"
-            self.global_data_labels[decl.name] = label
             self.data_section.append(f"{label}:")
             # Initialize with values or zeros
-            if decl.initializer:
-                # Initialize with provided values
-                for i, init_expr in enumerate(decl.initializer):
-                    if isinstance(init_expr, Literal):
-                        self.data_section.append(f"\tdd {init_expr.value}")
-                    else:
-                        # For non-constant initializers, use 0 (would need runtime init)
-                        self.data_section.append(f"\tdd 0")
-                # Fill remaining elements with zeros
-                for _ in range(size - len(decl.initializer)):
-                    self.data_section.append(f"\tdd 0")
-            else:
-                # Initialize with zeros
-                for _ in range(size):
-                    self.data_section.append(f"\tdd 0")
-            self.array_addresses[decl.name] = label  # Store label name for address calculation
+            # (non-constant initializers use 0, they would need runtime init)
+            values = [init_expr.value if isinstance(init_expr, Literal) else 0
+                      for init_expr in decl.initializer or []]
+            self._emit_data_words(values, size)
+            self.symbols[decl.name] = VarInfo(VarInfo.ARRAY, label, size, is_global=True)
         else:
             # Local array - allocate in memory (data section), not on stack
             # r:30 is used as stack pointer for variables only
@@ -1369,37 +1782,64 @@ class CodeGenerator:
             self.data_section.append(f"{label}:")
             
             # Initialize with values or zeros
+            values = []
             if decl.initializer:
                 # Initialize with provided values
                 for i, init_expr in enumerate(decl.initializer):
                     if isinstance(init_expr, Literal):
-                        self.data_section.append(f"\tdd {init_expr.value}")
+                        values.append(init_expr.value)
                     else:
                         # For non-constant initializers, we need to generate code to initialize at runtime
                         # For now, use 0 and generate initialization code
-                        self.data_section.append(f"\tdd 0")
+                        values.append(0)
                         # Generate runtime initialization code
                         value_reg = self.generate_expression(init_expr)
-                        addr_reg = self.reg_allocator.get_temp_register()
-                        self.emit(f"mov {self.get_register_name(addr_reg)}, {label} addr")
-                        index_reg = self.reg_allocator.get_temp_register()
-                        self.emit(f"mov {self.get_register_name(index_reg)}, {i}")
-                        self.emit(f"add {self.get_register_name(addr_reg)}, {self.get_register_name(addr_reg)}, {self.get_register_name(index_reg)}")
-                        self.emit(f"lds [{self.get_register_name(addr_reg)}], {self.get_register_name(value_reg)}")
+                        addr_reg = self._generate_element_address(self._get_array_base_reg(label), Literal(i))
+                        self.emit(f"lds [{_REG_NAMES[addr_reg]}], {_REG_NAMES[value_reg]}")
                         self.reg_allocator.free_temp(addr_reg)
-                        self.reg_allocator.free_temp(index_reg)
                         self.reg_allocator.free_temp(value_reg)
-                # Fill remaining elements with zeros
-                for _ in range(size - len(decl.initializer)):
-                    self.data_section.append(f"\tdd 0")
-            else:
-                # Initialize with zeros
-                for _ in range(size):
-                    self.data_section.append(f"\tdd 0")
+            self._emit_data_words(values, size)
             
             # Store label name for address calculation
-            self.array_addresses[decl.name] = label
-            self.array_sizes[decl.name] = size
+            self.symbols[decl.name] = VarInfo(VarInfo.ARRAY, label, size)
+    
+    def _emit_data_words(self, values: List[int], size: int) -> None:
+        """Append dd words for an array to the data section.
+        
+        Args:
+            values: Initial values of the leading elements
+            size: Total number of elements (the rest are zero)
+        
+        Runs of equal values are emitted as one 'times N dd V' line, so a
+        zero-initialized array is a single line whatever its size; the
+        remaining single values share 'dd a, b, ...' lines.
+        """
+        runs: List[List[int]] = []  # [value, count]
+        for value in values:
+            if runs and runs[-1][0] == value:
+                runs[-1][1] += 1
+            else:
+                runs.append([value, 1])
+        padding = size - len(values)
+        if padding > 0:
+            if runs and runs[-1][0] == 0:
+                runs[-1][1] += padding
+            else:
+                runs.append([0, padding])
+        singles: List[str] = []
+        for value, count in runs:
+            if count == 1:
+                singles.append(str(value))
+                if len(singles) == _DATA_WORDS_PER_LINE:
+                    self.data_section.append("\tdd " + ", ".join(singles))
+                    singles.clear()
+                continue
+            if singles:
+                self.data_section.append("\tdd " + ", ".join(singles))
+                singles.clear()
+            self.data_section.append(f"\ttimes {count} dd {value}")
+        if singles:
+            self.data_section.append("\tdd " + ", ".join(singles))
     
     def generate_pointer_decl(self, decl: PointerDecl) -> None:
         """Generate code for pointer declaration."""
@@ -1410,40 +1850,53 @@ class CodeGenerator:
             # Evaluate initializer (should be AddressOf expression)
             addr_reg = self.generate_expression(decl.initializer)
             if addr_reg != reg_num:
-                self.emit(f"mov {self.get_register_name(reg_num)}, {self.get_register_name(addr_reg)}")
+                self.emit(f"mov {_REG_NAMES[reg_num]}, {_REG_NAMES[addr_reg]}")
                 self.reg_allocator.free_temp(addr_reg)
         else:
             # Initialize to 0 (null pointer)
-            self.emit(f"mov {self.get_register_name(reg_num)}, 0")
+            self.emit(f"mov {_REG_NAMES[reg_num]}, 0")
+    
+    def _generate_element_address(self, base_reg: int, index: Expression) -> int:
+        """Generate base_reg + index (each element = 1 memory cell).
+        
+        A constant index needs no index register: element 0 is at the base
+        address itself and a small offset is the immediate operand of add.
+        
+        Returns:
+            Register number containing the element address (free it with free_temp)
+        """
+        offset = self.fold_constant(index)
+        if offset == 0:
+            return base_reg
+        if offset is not None and offset <= MAX_IMMEDIATE3:
+            self.reg_allocator.free_temp(base_reg)
+            addr_reg = self.reg_allocator.get_temp_register()
+            self.emit(f"add {_REG_NAMES[addr_reg]}, {_REG_NAMES[base_reg]}, {offset}")
+            return addr_reg
+        index_reg = self.generate_expression(index)
+        self.reg_allocator.free_temp(index_reg)
+        self.reg_allocator.free_temp(base_reg)
+        addr_reg = self.reg_allocator.get_temp_register()
+        self.emit(f"add {_REG_NAMES[addr_reg]}, {_REG_NAMES[base_reg]}, {_REG_NAMES[index_reg]}")
+        return addr_reg
     
     def generate_array_access(self, expr: ArrayAccess) -> int:
         """Generate code for array element access: arr[index]"""
-        # Evaluate index
-        index_reg = self.generate_expression(expr.index)
-        
         # Get base address
-        if expr.name in self.array_addresses:
-            base_addr = self.array_addresses[expr.name]
+        info = self.symbols.get(expr.name)
+        if info is not None and info.kind == VarInfo.ARRAY:
+            # All arrays (global and local) are in memory with labels; the
+            # address is held in a base register
+            base_reg = self._get_array_base_reg(info.addr)
+            
+            # The address is only needed by the load, so the result may
+            # reuse its register
+            addr_reg = self._generate_element_address(base_reg, expr.index)
+            self.reg_allocator.free_temp(addr_reg)
             result_reg = self.reg_allocator.get_temp_register()
-            addr_reg = self.reg_allocator.get_temp_register()
-            
-            # Calculate address: base + index (each element = 1 memory cell)
-            # All arrays (global and local) are now in memory with labels
-            if isinstance(base_addr, str):
-                # Array in memory - use label address
-                self.emit(f"mov {self.get_register_name(addr_reg)}, {base_addr} addr")
-            else:
-                # This should not happen anymore - all arrays should have string labels
-                raise RuntimeError(f"Array {expr.name} has invalid address type: {type(base_addr)}")
-            
-            # Add index
-            self.emit(f"add {self.get_register_name(addr_reg)}, {self.get_register_name(addr_reg)}, {self.get_register_name(index_reg)}")
             
             # Load value: lds result_reg, [addr_reg]
-            self.emit(f"lds {self.get_register_name(result_reg)}, [{self.get_register_name(addr_reg)}]")
-            
-            self.reg_allocator.free_temp(addr_reg)
-            self.reg_allocator.free_temp(index_reg)
+            self.emit(f"lds {_REG_NAMES[result_reg]}, [{_REG_NAMES[addr_reg]}]")
             return result_reg
         else:
             raise RuntimeError(f"Array {expr.name} not found")
@@ -1451,57 +1904,35 @@ class CodeGenerator:
     def generate_address_of(self, expr: AddressOf) -> int:
         """Generate code for address-of operator: &x"""
         operand = expr.operand
-        result_reg = self.reg_allocator.get_temp_register()
         
         if isinstance(operand, Identifier):
             # &variable
-            if operand.name in self.variable_addresses:
-                addr = self.variable_addresses[operand.name]
+            info = self.symbols.get(operand.name)
+            if info is not None and info.kind == VarInfo.VARIABLE:
+                result_reg = self.reg_allocator.get_temp_register()
+                addr = info.addr
                 if isinstance(addr, str):
                     # Global variable - use label
-                    self.emit(f"mov {self.get_register_name(result_reg)}, {addr} addr")
+                    self.emit(f"mov {_REG_NAMES[result_reg]}, {addr} addr")
                 else:
                     # Local variable - calculate address from r30
-                    self.emit(f"mov {self.get_register_name(result_reg)}, r:30")
                     if addr > 0:
-                        offset_reg = self.reg_allocator.get_temp_register()
-                        self.emit(f"mov {self.get_register_name(offset_reg)}, {addr}")
-                        self.emit(f"add {self.get_register_name(result_reg)}, {self.get_register_name(result_reg)}, {self.get_register_name(offset_reg)}")
-                        self.reg_allocator.free_temp(offset_reg)
-            elif operand.name in self.array_addresses:
+                        self.emit(f"add {_REG_NAMES[result_reg]}, r:30, {addr}")
+                    else:
+                        self.emit(f"mov {_REG_NAMES[result_reg]}, r:30")
+                return result_reg
+            elif info is not None:
                 # &array (base address)
-                # All arrays (global and local) are now in memory with labels
-                base_addr = self.array_addresses[operand.name]
-                if isinstance(base_addr, str):
-                    self.emit(f"mov {self.get_register_name(result_reg)}, {base_addr} addr")
-                else:
-                    # This should not happen anymore - all arrays should have string labels
-                    raise RuntimeError(f"Code generation error: Array '{operand.name}' has invalid address type '{type(base_addr).__name__}' in function '{self.current_function}'")
+                # All arrays (global and local) are in memory with labels
+                return self._get_array_base_reg(info.addr)
             else:
                 raise RuntimeError(f"Variable or array {operand.name} not found for address-of")
         elif isinstance(operand, ArrayAccess):
             # &arr[i] - address of array element
             arr_name = operand.name
-            index_reg = self.generate_expression(operand.index)
-            
-            if arr_name in self.array_addresses:
-                base_addr = self.array_addresses[arr_name]
-                addr_reg = self.reg_allocator.get_temp_register()
-                
-                # Calculate base address
-                # All arrays (global and local) are now in memory with labels
-                if isinstance(base_addr, str):
-                    self.emit(f"mov {self.get_register_name(addr_reg)}, {base_addr} addr")
-                else:
-                    # This should not happen anymore - all arrays should have string labels
-                    raise RuntimeError(f"Array {arr_name} has invalid address type: {type(base_addr)}")
-                
-                # Add index
-                self.emit(f"add {self.get_register_name(addr_reg)}, {self.get_register_name(addr_reg)}, {self.get_register_name(index_reg)}")
-                self.emit(f"mov {self.get_register_name(result_reg)}, {self.get_register_name(addr_reg)}")
-                
-                self.reg_allocator.free_temp(addr_reg)
-                self.reg_allocator.free_temp(index_reg)
+            info = self.symbols.get(arr_name)
+            if info is not None and info.kind == VarInfo.ARRAY:
+                return self._generate_element_address(self._get_array_base_reg(info.addr), operand.index)
             else:
                 raise RuntimeError(f"Array {arr_name} not found")
         elif isinstance(operand, Dereference):
@@ -1509,8 +1940,6 @@ class CodeGenerator:
             return self.generate_expression(operand.operand)
         else:
             raise RuntimeError(f"Code generation error: Cannot take address of '{type(operand).__name__}' in function '{self.current_function}'")
-        
-        return result_reg
     
     def generate_dereference(self, expr: Dereference) -> int:
         """Generate code for pointer dereference: *ptr"""
@@ -1519,39 +1948,25 @@ class CodeGenerator:
         
         # Load value from address: lds result_reg, [addr_reg]
         result_reg = self.reg_allocator.get_temp_register()
-        self.emit(f"lds {self.get_register_name(result_reg)}, [{self.get_register_name(addr_reg)}]")
+        self.emit(f"lds {_REG_NAMES[result_reg]}, [{_REG_NAMES[addr_reg]}]")
         
         self.reg_allocator.free_temp(addr_reg)
         return result_reg
     
     def generate_array_assignment(self, assign: ArrayAssignment) -> None:
         """Generate code for array element assignment: arr[i] = value"""
-        # Evaluate index and value
-        index_reg = self.generate_expression(assign.index)
-        value_reg = self.generate_expression(assign.value)
-        
         # Get base address
-        if assign.name in self.array_addresses:
-            base_addr = self.array_addresses[assign.name]
-            addr_reg = self.reg_allocator.get_temp_register()
-            
-            # Calculate address: base + index
-            # All arrays (global and local) are now in memory with labels
-            if isinstance(base_addr, str):
-                # Array in memory - use label address
-                self.emit(f"mov {self.get_register_name(addr_reg)}, {base_addr} addr")
-            else:
-                # This should not happen anymore - all arrays should have string labels
-                raise RuntimeError(f"Code generation error: Array '{assign.name}' has invalid address type '{type(base_addr).__name__}' in function '{self.current_function}'")
-            
-            # Add index
-            self.emit(f"add {self.get_register_name(addr_reg)}, {self.get_register_name(addr_reg)}, {self.get_register_name(index_reg)}")
+        info = self.symbols.get(assign.name)
+        if info is not None and info.kind == VarInfo.ARRAY:
+            # Calculate address: base + index (the index is evaluated before
+            # the value)
+            addr_reg = self._generate_element_address(self._get_array_base_reg(info.addr), assign.index)
+            value_reg = self.generate_expression(assign.value)
             
             # Store value: lds [addr_reg], value_reg
-            self.emit(f"lds [{self.get_register_name(addr_reg)}], {self.get_register_name(value_reg)}")
+            self.emit(f"lds [{_REG_NAMES[addr_reg]}], {_REG_NAMES[value_reg]}")
             
             self.reg_allocator.free_temp(addr_reg)
-            self.reg_allocator.free_temp(index_reg)
             self.reg_allocator.free_temp(value_reg)
         else:
             raise RuntimeError(f"Array {assign.name} not found")
@@ -1564,7 +1979,7 @@ class CodeGenerator:
         value_reg = self.generate_expression(assign.value)
         
         # Store value at address: lds [addr_reg], value_reg
-        self.emit(f"lds [{self.get_register_name(addr_reg)}], {self.get_register_name(value_reg)}")
+        self.emit(f"lds [{_REG_NAMES[addr_reg]}], {_REG_NAMES[value_reg]}")
         
         self.reg_allocator.free_temp(addr_reg)
         self.reg_allocator.free_temp(value_reg)
@@ -1573,26 +1988,20 @@ class CodeGenerator:
         """Generate code for increment statement."""
         reg = self.reg_allocator.get_register(stmt.name)
         if reg is None:
-            if stmt.name.startswith('r') and stmt.name[1:].isdigit():
+            if _is_register_name(stmt.name):
                 reg = int(stmt.name[1:])
             else:
                 raise RuntimeError(f"Undefined variable: {stmt.name}")
         
-        one_reg = self.reg_allocator.get_temp_register()
-        self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-        self.emit(f"add {self.get_register_name(reg)}, {self.get_register_name(reg)}, {self.get_register_name(one_reg)}")
-        self.reg_allocator.free_temp(one_reg)
+        self.emit(f"add {_REG_NAMES[reg]}, {_REG_NAMES[reg]}, 1")
     
     def generate_decrement(self, stmt: Decrement):
         """Generate code for decrement statement."""
         reg = self.reg_allocator.get_register(stmt.name)
         if reg is None:
-            if stmt.name.startswith('r') and stmt.name[1:].isdigit():
+            if _is_register_name(stmt.name):
                 reg = int(stmt.name[1:])
             else:
                 raise RuntimeError(f"Undefined variable: {stmt.name}")
         
-        one_reg = self.reg_allocator.get_temp_register()
-        self.emit(f"mov {self.get_register_name(one_reg)}, 1")
-        self.emit(f"sub {self.get_register_name(reg)}, {self.get_register_name(reg)}, {self.get_register_name(one_reg)}")
-        self.reg_allocator.free_temp(one_reg)
+        self.emit(f"sub {_REG_NAMES[reg]}, {_REG_NAMES[reg]}, 1")
@@ -6,13 +6,29 @@ Optionally runs the binary via interpreter_x64.exe.
 
 import sys
 import os
+import hashlib
+import json
 import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from version import __version__
-from pipeline import build_ast
+from pipeline import build_ast_cached
 from codegen import CodeGenerator
 from preprocessor import PreprocessingError
 
+# Only the end of the interpreter output is shown
+OUTPUT_TAIL_LINES = 150
+
+# Write buffer of the .asm file
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Tools shipped in int_pack (resolved once, not on every compile)
+_INT_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "int_pack")
+_FASM_EXE = os.path.join(_INT_PACK_DIR, "FASM.EXE")
+_INTERPRETER_EXE = os.path.join(_INT_PACK_DIR, "interpreter_x64.exe")
+
 
 def compile_file(source_file: str, output_file: str = None) -> str:
     """Compile a source file to assembly and optionally to binary. Returns path to .asm file."""
@@ -20,7 +36,7 @@ def compile_file(source_file: str, output_file: str = None) -> str:
         output_file = f"{os.path.splitext(source_file)[0]}.asm"
 
     try:
-        ast = build_ast(source_file)
+        ast = build_ast_cached(source_file)
     except FileNotFoundError as e:
         print(f"Error: {e}")
         sys.exit(1)
@@ -36,22 +52,27 @@ def compile_file(source_file: str, output_file: str = None) -> str:
         print(f"Syntax error: {e}")
         sys.exit(1)
 
+    # Lines go straight to a temporary file next to the output (no string of
+    # the whole program is built); it replaces the .asm only once code
+    # generation succeeded, so a failed run keeps the previous .asm
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
     try:
         generator = CodeGenerator(ast)
-        assembly_code = generator.generate(output_file)
+        with open(temp_file, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE) as f:
+            generator.generate(output_file, out=f)
+        os.replace(temp_file, output_file)
+        print(f"Assembly generated: {output_file}")
+    except OSError as e:
+        print(f"Error writing output file: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"Code generation error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
-
-    try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(assembly_code)
-        print(f"Assembly generated: {output_file}")
-    except OSError as e:
-        print(f"Error writing output file: {e}")
-        sys.exit(1)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
     try:
         compile_with_fasm(output_file)
@@ -62,10 +83,54 @@ def compile_file(source_file: str, output_file: str = None) -> str:
     return output_file
 
 
+def fasm_stamp(asm_file: str) -> dict:
+    """Everything a FASM run depends on: a hash of the .asm content and the
+    size and mtime of FASM.EXE and the int_pack include files.
+
+    Raises:
+        OSError: if one of the files cannot be read.
+    """
+    with open(asm_file, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    tools = [_FASM_EXE] + sorted(os.path.join(_INT_PACK_DIR, name)
+                                 for name in os.listdir(_INT_PACK_DIR) if name.endswith(".inc"))
+    stamp = {"asm": digest, "tools": {}}
+    for path in tools:
+        info = os.stat(path)
+        stamp["tools"][os.path.basename(path)] = [info.st_mtime_ns, info.st_size]
+    return stamp
+
+
+def _binary_stamp(bin_file: str) -> list:
+    info = os.stat(bin_file)
+    return [info.st_mtime_ns, info.st_size]
+
+
+def fasm_up_to_date(bin_file: str, stamp: dict) -> bool:
+    """Check the <bin>.stamp file written by the last successful FASM run:
+    the .bin is current if it is unchanged since then and was built from
+    the same .asm content with the same tools."""
+    try:
+        with open(bin_file + ".stamp", "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+        return recorded == dict(stamp, bin=_binary_stamp(bin_file))
+    except (OSError, ValueError):
+        return False
+
+
+def _write_fasm_stamp(bin_file: str, stamp: dict) -> None:
+    """Record the inputs of a successful FASM run; failures are ignored
+    (the next compile then just runs FASM again)."""
+    try:
+        with open(bin_file + ".stamp", "w", encoding="utf-8") as f:
+            json.dump(dict(stamp, bin=_binary_stamp(bin_file)), f)
+    except OSError:
+        pass
+
+
 def compile_with_fasm(asm_file: str):
     """Compile .asm file to .bin using FASM from int_pack."""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    fasm_exe = os.path.join(script_dir, "int_pack", "FASM.EXE")
+    fasm_exe = _FASM_EXE
 
     if not os.path.exists(fasm_exe):
         print(f"Warning: FASM.EXE not found at {fasm_exe}")
@@ -73,45 +138,70 @@ def compile_with_fasm(asm_file: str):
         print(f'  "{fasm_exe}" "{asm_file}"')
         return
 
+    bin_file = asm_file.replace(".asm", ".bin")
+    mif_file = asm_file.replace(".asm", ".mif")
+    try:
+        stamp = fasm_stamp(asm_file)
+    except OSError:
+        stamp = None
+    if stamp is not None and fasm_up_to_date(bin_file, stamp):
+        print("FASM: up to date.")
+        print(f"  Binary: {bin_file}")
+        if os.path.exists(mif_file):
+            print(f"  MIF: {mif_file}")
+        return
+
     asm_abs = os.path.abspath(asm_file)
     asm_dir = os.path.dirname(asm_abs)
-    old_cwd = os.getcwd()
 
+    # FASM resolves includes from its working directory; cwd= sets it for
+    # the child only, so concurrent compiles in one process do not race
     try:
-        os.chdir(asm_dir)
-        try:
-            result = subprocess.run(
-                [fasm_exe, os.path.basename(asm_abs)],
-                capture_output=True,
-                text=True,
-                cwd=asm_dir,
-                timeout=30,
-            )
-        except subprocess.TimeoutExpired:
-            print("FASM compilation timed out after 30 seconds")
-            raise RuntimeError("FASM compilation timed out")
-
-        if result.returncode == 0:
-            bin_file = asm_file.replace(".asm", ".bin")
-            mif_file = asm_file.replace(".asm", ".mif")
-            print("FASM compilation successful.")
-            if os.path.exists(bin_file):
-                print(f"  Binary: {bin_file}")
-            if os.path.exists(mif_file):
-                print(f"  MIF: {mif_file}")
-        else:
-            print("FASM compilation failed:")
-            print(result.stdout)
-            print(result.stderr)
-            raise RuntimeError("FASM compilation failed")
-    finally:
-        os.chdir(old_cwd)
+        result = subprocess.run(
+            [fasm_exe, os.path.basename(asm_abs)],
+            capture_output=True,
+            text=True,
+            cwd=asm_dir,
+            timeout=30,
+        )
+    except subprocess.TimeoutExpired:
+        print("FASM compilation timed out after 30 seconds")
+        raise RuntimeError("FASM compilation timed out")
+
+    if result.returncode == 0:
+        print("FASM compilation successful.")
+        if os.path.exists(bin_file):
+            print(f"  Binary: {bin_file}")
+            if stamp is not None:
+                _write_fasm_stamp(bin_file, stamp)
+        if os.path.exists(mif_file):
+            print(f"  MIF: {mif_file}")
+    else:
+        print("FASM compilation failed:")
+        print(result.stdout)
+        print(result.stderr)
+        raise RuntimeError("FASM compilation failed")
+
+
+def _read_tail(stream, tail: deque, counter: list):
+    """Read stream line by line, keeping the last lines in tail and the
+    total line count in counter[0]."""
+    for line in stream:
+        tail.append(line.rstrip("\n"))
+        counter[0] += 1
+    stream.close()
+
+
+def _print_tail(tail: deque, total: int, file=None):
+    """Print the kept lines, noting how many earlier ones were dropped."""
+    if total > len(tail):
+        print(f"... ({total - len(tail)} lines omitted) ...", file=file)
+    print("\n".join(tail), file=file)
 
 
 def run_interpreter(bin_file: str):
     """Run the compiled .bin file using interpreter_x64.exe."""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    interpreter_exe = os.path.join(script_dir, "int_pack", "interpreter_x64.exe")
+    interpreter_exe = _INTERPRETER_EXE
 
     if not os.path.exists(interpreter_exe):
         print(f"Error: interpreter_x64.exe not found at {interpreter_exe}")
@@ -126,43 +216,90 @@ def run_interpreter(bin_file: str):
     print(f"Running interpreter: {bin_abs}")
     print("=" * 50)
 
+    # Output is read while the program runs and only the last lines are
+    # kept, so a verbose program never has its whole output in memory
+    process = subprocess.Popen(
+        [interpreter_exe, bin_abs],
+        cwd=os.path.dirname(bin_abs),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    stdout_tail, stdout_count = deque(maxlen=OUTPUT_TAIL_LINES), [0]
+    stderr_tail, stderr_count = deque(maxlen=OUTPUT_TAIL_LINES), [0]
+    readers = [
+        threading.Thread(target=_read_tail, args=(process.stdout, stdout_tail, stdout_count), daemon=True),
+        threading.Thread(target=_read_tail, args=(process.stderr, stderr_tail, stderr_count), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
     try:
-        result = subprocess.run(
-            [interpreter_exe, bin_abs],
-            cwd=os.path.dirname(bin_abs),
-            capture_output=True,
-            text=True,
-            timeout=10,
-        )
+        returncode = process.wait(timeout=10)
     except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
         print("=" * 50)
         print("ERROR: Program execution timed out after 10 seconds")
         print("This usually indicates an infinite loop or very slow execution.")
         print("=" * 50)
         sys.exit(124)
+    for reader in readers:
+        reader.join()
 
-    if result.stdout:
-        lines = result.stdout.split("\n")
-        if len(lines) > 150:
-            print(f"... ({len(lines) - 150} lines omitted) ...")
-            print("\n".join(lines[-150:]))
-        else:
-            print(result.stdout)
+    if stdout_count[0]:
+        _print_tail(stdout_tail, stdout_count[0])
 
-    if result.stderr:
+    if stderr_count[0]:
         print("Errors:", file=sys.stderr)
-        stderr_lines = result.stderr.split("\n")
-        if len(stderr_lines) > 150:
-            print(f"... ({len(stderr_lines) - 150} lines omitted) ...", file=sys.stderr)
-            print("\n".join(stderr_lines[-150:]), file=sys.stderr)
-        else:
-            print(result.stderr, file=sys.stderr)
+        _print_tail(stderr_tail, stderr_count[0], file=sys.stderr)
+
+    sys.exit(returncode)
 
-    sys.exit(result.returncode)
+
+def _compile_one(source_file: str) -> bool:
+    """Compile one file of a batch. Returns True on success.
+
+    compile_file prints the errors it expects and exits; anything else it
+    raises (e.g. a RecursionError on very deeply nested source) is printed
+    here, so that one file cannot stop the rest of the batch.
+    """
+    try:
+        compile_file(source_file)
+    except SystemExit as e:
+        return not e.code
+    except Exception as e:
+        print(f"Error compiling {source_file}: {type(e).__name__}: {e}")
+        return False
+    return True
+
+
+def read_batch_file(list_file: str) -> list:
+    """Source paths listed in a batch file: one per line, blank lines and
+    lines starting with '#' are skipped."""
+    with open(list_file, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def compile_batch(source_files: list) -> int:
+    """Compile independent source files in parallel, one process per CPU.
+    Returns the number of files that failed."""
+    if not source_files:
+        return 0
+    workers = min(len(source_files), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_compile_one, source_files))
+    failed = [path for path, ok in zip(source_files, results) if not ok]
+    print(f"Batch: {len(source_files) - len(failed)} of {len(source_files)} files compiled.")
+    for path in failed:
+        print(f"  Failed: {path}")
+    return len(failed)
 
 
 def _print_usage():
     print("Usage: python compile.py <source_file> [output_file] [--run]")
+    print("       python compile.py --batch <list_file>")
     print("")
     print("Compiles a .sc source file to FASM assembly (.asm), then to binary (.bin).")
     print("If output_file is not specified, output will be <source_file>.asm")
@@ -171,12 +308,14 @@ def _print_usage():
     print("  -h, --help    Show this help")
     print("  -V, --version Show version")
     print("  --run         After compilation, run the binary using interpreter_x64.exe")
+    print("  --batch FILE  Compile every source listed in FILE (one per line) in parallel")
     print(f"Version: {__version__}")
     print("")
     print("Examples:")
     print("  python compile.py test_examples/basic/sum_range.sc")
     print("  python compile.py test_examples/basic/sum_range.sc --run")
     print("  python compile.py --run test_examples/basic/sum_range.sc")
+    print("  python compile.py --batch sources.txt")
 
 
 def main():
@@ -189,8 +328,10 @@ def main():
     source_file = None
     output_file = None
     run_after = False
+    batch_file = None
 
-    for arg in args:
+    args_iter = iter(args)
+    for arg in args_iter:
         if arg in ("-h", "--help", "-help"):
             _print_usage()
             sys.exit(0)
@@ -199,6 +340,12 @@ def main():
             sys.exit(0)
         if arg == "--run":
             run_after = True
+        elif arg == "--batch":
+            batch_file = next(args_iter, None)
+            if batch_file is None:
+                print("Error: --batch expects a list file.")
+                _print_usage()
+                sys.exit(1)
         elif not arg.startswith("-"):
             if source_file is None:
                 source_file = arg
@@ -209,6 +356,18 @@ def main():
                 _print_usage()
                 sys.exit(1)
 
+    if batch_file is not None:
+        if source_file is not None or run_after:
+            print("Error: --batch cannot be combined with a source file or --run.")
+            _print_usage()
+            sys.exit(1)
+        try:
+            source_files = read_batch_file(batch_file)
+        except OSError as e:
+            print(f"Error reading batch file: {e}")
+            sys.exit(1)
+        sys.exit(1 if compile_batch(source_files) else 0)
+
     if source_file is None:
         print("Error: no source file specified.")
         _print_usage()
@@ -13,6 +13,7 @@ The lexer tracks line and column numbers for error reporting.
 """
 
 import re
+import sys
 from enum import Enum
 from typing import List, Optional, Tuple
 
@@ -80,6 +81,8 @@ class TokenType(Enum):
 
 
 class Token:
+    __slots__ = ('type', 'value', 'line', 'column')
+    
     def __init__(self, type: TokenType, value: str, line: int, column: int):
         self.type = type
         self.value = value
@@ -165,7 +168,9 @@ class Lexer:
         start = self.pos
         while self.current_char() and (self.current_char().isalnum() or self.current_char() == '_'):
             self.advance()
-        return self.source[start:self.pos]
+        # Interned: every use of a name shares one string, in the tokens,
+        # in the AST and in the cached AST pickle
+        return sys.intern(self.source[start:self.pos])
     
     def peek_after_whitespace(self) -> Optional[str]:
         """Return next non-whitespace character without advancing, or None."""
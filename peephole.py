@@ -0,0 +1,341 @@
+"""
+Peephole optimizer for generated FASM assembly.
+
+Works on the list of lines produced by CodeGenerator (instructions are
+tab-indented, labels end with ':'). A small window of adjacent
+instructions is matched against rewrite rules:
+- mov Rx, Rx                      -> removed
+- add/sub/or/xor/shl/shr Rd, Rd, 0 -> removed
+- mov Rt, K / op Rd, Rs, Rt       -> op Rd, Rs, K (Rt dead afterwards;
+                                     not for sar/sal/ror/rol)
+- mov Rt, Rs / op ..., Rt, ...     -> op ..., Rs, ... (Rt dead afterwards)
+- op Ra, ... / mov Rc, Ra         -> op Rc, ... (Ra dead afterwards)
+- a pure instruction whose destination is dead -> removed
+- mov Rt, K when Rt already holds K in this block -> removed
+- a jump (mov/cmov r:31) to the label right after it -> removed
+- optionally, a label nothing refers to     -> removed
+
+Labels, jumps (writes to r:31), hlt and any unrecognized line end a basic
+block. Registers are assumed live at the end of a block (after hlt only r:0,
+the program result, is live), so rewrites never cross control flow.
+"""
+
+import re
+from typing import FrozenSet, List, Optional, Tuple
+
+# Largest immediate accepted as the third operand (15-bit field; kept
+# non-negative so the value does not depend on sign extension)
+MAX_IMMEDIATE3 = (1 << 14) - 1
+
+_INSTRUCTION_RE = re.compile(r"^\t([a-z]+) (.+)$")
+_REGISTER_RE = re.compile(r"^r:(\d+)$")
+_MEMORY_RE = re.compile(r"^\[r:(\d+)\]$")
+_IMMEDIATE_RE = re.compile(r"^\d+$")
+_LABEL_RE = re.compile(r"^([A-Za-z_][\w.]*):$")
+_NAME_RE = re.compile(r"[A-Za-z_][\w.]*")
+
+# Three-operand instructions: op rd, rs, (rt | imm15)
+_ALU_OPS = frozenset({'add', 'sub', 'and', 'or', 'xor', 'shl', 'shr', 'sar',
+                      'sal', 'ror', 'rol', 'cmpa', 'cmpb', 'cmpe'})
+_COMMUTATIVE_OPS = frozenset({'add', 'and', 'or', 'xor', 'cmpe'})
+# a > b is b < a: comparisons with the constant on the left swap opcode
+_SWAPPED_OPS = {'cmpa': 'cmpb', 'cmpb': 'cmpa'}
+# Shifts whose shift-type flag (bit 30) falls inside the 15-bit immediate
+# field of the three-operand form: only their register form is correct
+_REGISTER_ONLY_OPS = frozenset({'sar', 'sal', 'ror', 'rol'})
+# Instructions that leave rd unchanged when the third operand is 0
+_IDENTITY_ZERO_OPS = frozenset({'add', 'sub', 'or', 'xor', 'shl', 'shr'})
+_CMOV_OPS = frozenset({'cmovz', 'cmovnz'})
+_READ_ONLY_OPS = frozenset({'outu', 'setu', 'setg', 'outg'})
+_WRITE_ONLY_OPS = frozenset({'inu', 'getg'})
+
+# r29 (return address), r30 (stack pointer), r31 (instruction pointer)
+_FIXED_REGISTERS = frozenset({29, 30, 31})
+
+
+class _Instruction:
+    """A parsed instruction with the registers it reads and writes."""
+    __slots__ = ('op', 'operands', 'dest', 'reads', 'pure')
+
+    def __init__(self, op: str, operands: List[str], dest: Optional[int],
+                 reads: FrozenSet[int], pure: bool):
+        self.op = op
+        self.operands = operands
+        self.dest = dest  # register fully overwritten, or None
+        self.reads = reads
+        self.pure = pure  # only effect is writing dest
+
+
+def _register(operand: str) -> Optional[int]:
+    match = _REGISTER_RE.match(operand)
+    return int(match.group(1)) if match else None
+
+
+def _parse(line: str) -> Optional[_Instruction]:
+    """Parse an instruction line, or return None for anything that is not a
+    recognized instruction (labels, directives, inline asm we don't model)."""
+    match = _INSTRUCTION_RE.match(line)
+    if not match:
+        return None
+    op = match.group(1)
+    operands = match.group(2).split(", ")
+    regs = [_register(operand) for operand in operands]
+
+    if op == 'mov' and len(operands) == 2 and regs[0] is not None:
+        reads = {regs[1]} if regs[1] is not None else set()
+        return _Instruction(op, operands, regs[0], frozenset(reads), True)
+    if op in _ALU_OPS and len(operands) == 3 and regs[0] is not None and regs[1] is not None:
+        reads = {regs[1]} if regs[2] is None else {regs[1], regs[2]}
+        return _Instruction(op, operands, regs[0], frozenset(reads), True)
+    if op == 'not' and len(operands) == 2 and regs[0] is not None and regs[1] is not None:
+        return _Instruction(op, operands, regs[0], frozenset({regs[1]}), True)
+    if op in _CMOV_OPS and len(operands) == 3 and regs[0] is not None and regs[1] is not None:
+        # Conditional write: the old value of rd survives, so rd is also read
+        reads = {regs[0], regs[1]} | ({regs[2]} if regs[2] is not None else set())
+        return _Instruction(op, operands, None, frozenset(reads), False)
+    if op == 'lds' and len(operands) == 2:
+        load_addr = _MEMORY_RE.match(operands[1])
+        if regs[0] is not None and load_addr:
+            return _Instruction(op, operands, regs[0], frozenset({int(load_addr.group(1))}), True)
+        store_addr = _MEMORY_RE.match(operands[0])
+        if store_addr and regs[1] is not None:
+            return _Instruction(op, operands, None, frozenset({int(store_addr.group(1)), regs[1]}), False)
+        return None
+    if op in _READ_ONLY_OPS and len(operands) == 1 and regs[0] is not None:
+        return _Instruction(op, operands, None, frozenset({regs[0]}), False)
+    if op in _WRITE_ONLY_OPS and len(operands) == 1 and regs[0] is not None:
+        return _Instruction(op, operands, regs[0], frozenset(), False)
+    return None
+
+
+def _ends_block(instr: Optional[_Instruction]) -> bool:
+    return instr is None or instr.dest == 31 or (instr.op in _CMOV_OPS and instr.operands[0] == "r:31")
+
+
+def _is_dead(parsed: List[Optional[_Instruction]], lines: List[str], start: int, reg: int) -> bool:
+    """Check whether reg is overwritten before being read, scanning from
+    index start to the end of the current basic block."""
+    for i in range(start, len(lines)):
+        if lines[i].startswith("\t;"):
+            continue
+        instr = parsed[i]
+        if lines[i] == "\thlt":
+            # Nothing runs after the program halts; r:0 holds its result
+            return reg != 0
+        if instr is None or reg in instr.reads:
+            return False
+        if instr.dest == reg:
+            return True
+        if _ends_block(instr):
+            return False
+    return False
+
+
+def _is_dead_after(parsed: List[Optional[_Instruction]], lines: List[str], index: int, reg: int) -> bool:
+    """Check whether reg is dead after the instruction at index. If that
+    instruction is a jump, reg may be read at the jump target, so it is
+    treated as live."""
+    if index >= len(lines) or _ends_block(parsed[index]):
+        return False
+    return _is_dead(parsed, lines, index + 1, reg)
+
+
+def _next_instruction(lines: List[str], start: int) -> int:
+    """Index of the next non-comment line at or after start."""
+    i = start
+    while i < len(lines) and lines[i].startswith("\t;"):
+        i += 1
+    return i
+
+
+def _fold_immediate(instr: _Instruction, reg: int, value: str) -> Optional[str]:
+    """Rewrite instr so that it uses immediate value instead of reg, if the
+    ISA allows it (immediates are only accepted as the third operand)."""
+    operands = instr.operands
+    if instr.op in _REGISTER_ONLY_OPS:
+        return None
+    if instr.op in _ALU_OPS or instr.op in _CMOV_OPS:
+        if _register(operands[2]) == reg and _register(operands[1]) != reg:
+            return f"\t{instr.op} {operands[0]}, {operands[1]}, {value}"
+        if _register(operands[1]) == reg and _register(operands[2]) is not None and _register(operands[2]) != reg:
+            if instr.op in _COMMUTATIVE_OPS:
+                return f"\t{instr.op} {operands[0]}, {operands[2]}, {value}"
+            if instr.op in _SWAPPED_OPS:
+                return f"\t{_SWAPPED_OPS[instr.op]} {operands[0]}, {operands[2]}, {value}"
+    elif instr.op == 'mov' and _register(operands[1]) == reg:
+        return f"\tmov {operands[0]}, {value}"
+    return None
+
+
+def _substitute_source(instr: _Instruction, reg: int, replacement: str) -> Optional[str]:
+    """Rewrite instr to read replacement wherever it reads reg, or return
+    None if reg is also used in a position that is not a plain read (the
+    destination of a cmov, which keeps its old value when not taken)."""
+    operands = list(instr.operands)
+    name = f"r:{reg}"
+    if instr.op in _CMOV_OPS:
+        if operands[0] == name:
+            return None
+        read_positions = (1, 2)
+    elif instr.op == 'lds':
+        memory = f"[{name}]"
+        operands = [f"[{replacement}]" if operand == memory else operand for operand in operands]
+        # A store also reads its value operand
+        read_positions = (1,) if _MEMORY_RE.match(instr.operands[0]) else ()
+    elif instr.op in _READ_ONLY_OPS:
+        read_positions = (0,)
+    else:
+        read_positions = range(1, len(operands))
+    for position in read_positions:
+        if operands[position] == name:
+            operands[position] = replacement
+    return f"\t{instr.op} {', '.join(operands)}"
+
+
+def _peephole_pass(lines: List[str]) -> Tuple[List[str], bool]:
+    """Run the rewrite rules once over lines. Returns (new lines, changed)."""
+    parsed = [_parse(line) for line in lines]
+    deleted = [False] * len(lines)
+    changed = False
+
+    for i, instr in enumerate(parsed):
+        if instr is None or deleted[i]:
+            continue
+        ops = instr.operands
+
+        # mov Rx, Rx
+        if instr.op == 'mov' and ops[0] == ops[1]:
+            deleted[i] = True
+            changed = True
+            continue
+
+        # add Rd, Rd, 0 (and other ops with 0 as identity)
+        if instr.op in _IDENTITY_ZERO_OPS and ops[0] == ops[1] and ops[2] == "0":
+            deleted[i] = True
+            changed = True
+            continue
+
+        # mov r:31, L addr / L:  (and the cmov form): jump to the next line
+        if ops[0] == "r:31" and (instr.op == 'mov' or instr.op in _CMOV_OPS) and ops[-1].endswith(" addr"):
+            j = _next_instruction(lines, i + 1)
+            if j < len(lines) and lines[j] == ops[-1][:-len(" addr")] + ":":
+                deleted[i] = True
+                changed = True
+                continue
+
+        if not instr.pure or instr.dest in _FIXED_REGISTERS:
+            continue
+
+        j = _next_instruction(lines, i + 1)
+        following = parsed[j] if j < len(lines) else None
+
+        # mov Rt, K / op Rd, Rs, Rt  ->  op Rd, Rs, K
+        if instr.op == 'mov' and following is not None and instr.dest in following.reads \
+                and _IMMEDIATE_RE.match(ops[1]) and int(ops[1]) <= MAX_IMMEDIATE3:
+            folded = _fold_immediate(following, instr.dest, ops[1])
+            if folded is not None and (following.dest == instr.dest or _is_dead_after(parsed, lines, j, instr.dest)):
+                lines[j] = folded
+                parsed[j] = _parse(folded)
+                deleted[i] = True
+                changed = True
+                continue
+
+        # mov Rt, Rs / op ..., Rt, ...  ->  op ..., Rs, ...
+        if instr.op == 'mov' and following is not None and instr.dest in following.reads:
+            source = _register(ops[1])
+            propagated = _substitute_source(following, instr.dest, ops[1]) if source is not None else None
+            if propagated is not None and (following.dest == instr.dest or _is_dead_after(parsed, lines, j, instr.dest)):
+                lines[j] = propagated
+                parsed[j] = _parse(propagated)
+                deleted[i] = True
+                changed = True
+                continue
+
+        # op Ra, ... / mov Rc, Ra  ->  op Rc, ...
+        if following is not None and following.op == 'mov' and _register(following.operands[1]) == instr.dest \
+                and following.dest not in _FIXED_REGISTERS and _is_dead_after(parsed, lines, j, instr.dest):
+            retargeted = f"\t{instr.op} {following.operands[0]}, {', '.join(ops[1:])}"
+            lines[j] = retargeted
+            parsed[j] = _parse(retargeted)
+            deleted[i] = True
+            changed = True
+            continue
+
+        # Pure instruction writing a register nobody reads
+        if _is_dead(parsed, lines, i + 1, instr.dest):
+            deleted[i] = True
+            changed = True
+
+    if not changed:
+        return lines, False
+    return [line for line, dead in zip(lines, deleted) if not dead], True
+
+
+def _remove_redundant_loads(lines: List[str]) -> Tuple[List[str], bool]:
+    """Delete 'mov Rt, K' when Rt is known to hold K already.
+
+    Tracks the constant (immediate or label address) loaded into each
+    register within a basic block; labels and unrecognized lines forget
+    everything, and any write to a register forgets its value.
+    """
+    known = {}  # register -> constant operand text
+    result = []
+    changed = False
+    for line in lines:
+        if line.startswith("\t;"):
+            result.append(line)
+            continue
+        instr = _parse(line)
+        if instr is None:
+            known.clear()
+            result.append(line)
+            continue
+        if instr.op == 'mov' and instr.dest is not None and instr.dest not in _FIXED_REGISTERS \
+                and _register(instr.operands[1]) is None:
+            if known.get(instr.dest) == instr.operands[1]:
+                changed = True
+                continue
+            known[instr.dest] = instr.operands[1]
+        elif instr.dest is not None:
+            known.pop(instr.dest, None)
+        elif instr.op in _CMOV_OPS:
+            known.pop(_register(instr.operands[0]), None)
+        result.append(line)
+    return result, changed
+
+
+def _remove_unused_labels(lines: List[str]) -> Tuple[List[str], bool]:
+    """Delete labels that no line refers to, so that the blocks around them
+    merge and the other rules can work across the former boundary."""
+    labels = [_LABEL_RE.match(line) for line in lines]
+    referenced = set()
+    for line, label in zip(lines, labels):
+        if label is None and not line.startswith("\t;"):
+            referenced.update(_NAME_RE.findall(line))
+    result = [line for line, label in zip(lines, labels)
+              if label is None or label.group(1) in referenced]
+    return result, len(result) != len(lines)
+
+
+def peephole(lines: List[str], drop_unused_labels: bool = False) -> List[str]:
+    """Optimize generated assembly lines until no rule applies.
+
+    Args:
+        lines: Assembly lines as produced by CodeGenerator
+        drop_unused_labels: Also delete labels not referenced within lines
+            (only safe when no other code can jump into them)
+
+    Returns:
+        New list of optimized lines
+    """
+    lines = list(lines)
+    changed = True
+    while changed:
+        lines, changed = _peephole_pass(lines)
+        if not changed:
+            # Only after folding has settled: a reused constant register
+            # would otherwise keep the constant from becoming an immediate
+            lines, changed = _remove_redundant_loads(lines)
+        if not changed and drop_unused_labels:
+            lines, changed = _remove_unused_labels(lines)
+    return lines
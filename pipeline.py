@@ -1,31 +1,82 @@
 """
 Shared front-end pipeline: preprocess → lex → parse.
 Used by main.py (interpreter) and compile.py (compiler).
+
+compile.py goes through build_ast_cached(), which keeps parsed ASTs in
+ast_cache/ keyed by a hash of the preprocessed source, the compiler
+version and the front-end sources (FRONT_END_FINGERPRINT), so an
+unchanged program is not lexed and parsed again. A
+sidecar .meta file per source records the size and mtime of every file
+the preprocessor read and the include candidates it found missing; while
+the files match and the missing ones are still absent, the cached AST is
+loaded without even preprocessing.
 """
 
+import hashlib
+import json
 import os
+import pickle
+import sys
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import xxhash
+except ImportError:  # optional; hashlib's SHA-256 is used without it
+    xxhash = None
 
 from lexer import Lexer, TokenType
 from parser import Parser
 from preprocessor import Preprocessor, PreprocessingError
+from version import __version__
 
+# Directory of the persistent AST cache (next to the compiler sources)
+AST_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ast_cache")
 
-def build_ast(source_file: str):
+
+def _front_end_fingerprint() -> str:
+    """Hash of the preprocessor, lexer and parser sources (the parser module
+    also defines the AST node classes). Editing any of them changes the
+    ASTs that are built, even without a new compiler version."""
+    digest = hashlib.sha256()
+    for cls in (Preprocessor, Lexer, Parser):
+        with open(sys.modules[cls.__module__].__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Part of every AST cache key and .meta record
+FRONT_END_FINGERPRINT = _front_end_fingerprint()
+
+
+def preprocess_source(source_file: str, preprocessor: Optional[Preprocessor] = None) -> str:
     """
-    Run preprocess, lex, parse on a source file. Returns the AST.
+    Run the preprocessor on a source file. Returns the expanded source.
+
+    Args:
+        source_file: Path of the main source file
+        preprocessor: Preprocessor to use (afterwards its included_files
+            holds every file that was read); a new one by default
 
     Raises:
         FileNotFoundError: if source_file does not exist.
         PreprocessingError: on preprocessor errors.
-        RuntimeError: on lexer errors (message starts with "Lexer error: ").
-        SyntaxError: on parser errors.
     """
     if not os.path.exists(source_file):
         raise FileNotFoundError(f"File '{source_file}' not found.")
 
-    preprocessor = Preprocessor()
-    source_code = preprocessor.preprocess(source_file)
+    if preprocessor is None:
+        preprocessor = Preprocessor()
+    return preprocessor.preprocess(source_file)
+
 
+def parse_source(source_code: str):
+    """
+    Run lex, parse on preprocessed source. Returns the AST.
+
+    Raises:
+        RuntimeError: on lexer errors (message starts with "Lexer error: ").
+        SyntaxError: on parser errors.
+    """
     lexer = Lexer(source_code)
     tokens = lexer.tokenize()
 
@@ -35,3 +86,121 @@ def build_ast(source_file: str):
 
     parser = Parser(tokens)
     return parser.parse()
+
+
+def build_ast(source_file: str):
+    """
+    Run preprocess, lex, parse on a source file. Returns the AST.
+
+    Raises:
+        FileNotFoundError: if source_file does not exist.
+        PreprocessingError: on preprocessor errors.
+        RuntimeError: on lexer errors (message starts with "Lexer error: ").
+        SyntaxError: on parser errors.
+    """
+    return parse_source(preprocess_source(source_file))
+
+
+def ast_cache_key(source_code: str) -> str:
+    """Cache key of preprocessed source: changes with the source, with the
+    compiler version and with FRONT_END_FINGERPRINT (a changed parser may
+    build a different AST).
+
+    With the xxhash package installed the key is an XXH3-128 digest (much
+    faster than SHA-256 on large sources); the "x3-" prefix keeps its
+    entries apart from SHA-256 ones.
+    """
+    data = f"{__version__}\0{FRONT_END_FINGERPRINT}\0".encode("utf-8") + source_code.encode("utf-8")
+    if xxhash is not None:
+        return "x3-" + xxhash.xxh3_128_hexdigest(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_stamps(paths: Iterable[str]) -> Dict[str, List[int]]:
+    """(mtime_ns, size) of each file; raises OSError if one is missing."""
+    stamps = {}
+    for path in paths:
+        info = os.stat(path)
+        stamps[path] = [info.st_mtime_ns, info.st_size]
+    return stamps
+
+
+def _load_pickle(path: str):
+    """Load a cached AST, or return None if the entry is missing or unusable."""
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, RecursionError):
+        return None
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write a cache file through a temporary file, so a concurrent compile
+    never reads a half-written entry. Failures are ignored."""
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_file, "wb") as f:
+            f.write(data)
+        os.replace(temp_file, path)
+    except OSError:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+
+
+def build_ast_cached(source_file: str, cache_dir: str = AST_CACHE_DIR):
+    """
+    Like build_ast(), but reuse the AST parsed for identical preprocessed
+    source in an earlier run.
+
+    If no file read by the last preprocessing of source_file changed size
+    or mtime and no missing include candidate appeared, the cached AST is
+    loaded straight away. Otherwise the source
+    is preprocessed and looked up by content, so touching a file without
+    changing it still avoids parsing.
+
+    The cache is only an optimization: entries that cannot be read or
+    written are ignored and the source is parsed as usual.
+    """
+    source_path = os.path.abspath(source_file)
+    path_key = hashlib.sha256(source_path.encode("utf-8")).hexdigest()
+    meta_file = os.path.join(cache_dir, f"{path_key}.meta")
+
+    # Fast path: every dependency has the size and mtime recorded last time,
+    # and no file has appeared where an #include looked before (it would
+    # now be included instead). Include lookup also depends on the cwd.
+    try:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] == __version__ and meta["front_end"] == FRONT_END_FINGERPRINT \
+                and meta["cwd"] == os.getcwd() and _file_stamps(meta["files"]) == meta["files"] \
+                and not any(os.path.exists(path) for path in meta["missing"]):
+            ast = _load_pickle(os.path.join(cache_dir, f"{meta['key']}.pkl"))
+            if ast is not None:
+                return ast
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    preprocessor = Preprocessor()
+    source_code = preprocess_source(source_file, preprocessor)
+    key = ast_cache_key(source_code)
+    cache_file = os.path.join(cache_dir, f"{key}.pkl")
+
+    ast = _load_pickle(cache_file)
+    if ast is None:
+        ast = parse_source(source_code)
+        try:
+            _write_atomic(cache_file, pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, RecursionError):
+            return ast
+
+    try:
+        stamps = _file_stamps(sorted(preprocessor.included_files))
+    except OSError:
+        return ast
+    meta = {"version": __version__, "front_end": FRONT_END_FINGERPRINT, "key": key, "cwd": os.getcwd(),
+            "files": stamps, "missing": sorted(preprocessor.missing_paths)}
+    _write_atomic(meta_file, json.dumps(meta).encode("utf-8"))
+    return ast
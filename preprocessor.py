@@ -28,6 +28,9 @@ class Preprocessor:
     def __init__(self, base_dir: str = None):
         self.base_dir = base_dir or os.getcwd()
         self.included_files: Set[str] = set()
+        # Include candidates that were tried and did not exist (a file
+        # created there later would change what an #include resolves to)
+        self.missing_paths: Set[str] = set()
         self.definitions: Dict[str, str] = {}  # macro name -> replacement text
     
     def resolve_path(self, filename: str, current_dir: str) -> str:
@@ -41,15 +44,18 @@ class Preprocessor:
             path = os.path.join(current_dir, filename)
             if os.path.exists(path):
                 return os.path.abspath(path)
+            self.missing_paths.add(os.path.abspath(path))
         
         # Try relative to base directory
         path = os.path.join(self.base_dir, filename)
         if os.path.exists(path):
             return os.path.abspath(path)
+        self.missing_paths.add(os.path.abspath(path))
         
         # If still not found, try as-is (might be in current working directory)
         if os.path.exists(filename):
             return os.path.abspath(filename)
+        self.missing_paths.add(os.path.abspath(filename))
         
         raise PreprocessingError(f"Include file not found: {filename}")
     
@@ -20,6 +20,10 @@ def run_tests():
     suite.addTests(loader.loadTestsFromName('self_tests.test_parser'))
     suite.addTests(loader.loadTestsFromName('self_tests.test_interpreter'))
     suite.addTests(loader.loadTestsFromName('self_tests.test_preprocessor'))
+    suite.addTests(loader.loadTestsFromName('self_tests.test_codegen'))
+    suite.addTests(loader.loadTestsFromName('self_tests.test_peephole'))
+    suite.addTests(loader.loadTestsFromName('self_tests.test_pipeline'))
+    suite.addTests(loader.loadTestsFromName('self_tests.test_compile'))
     
     # Run the tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,309 @@
+"""
+Unit tests for the code generator.
+"""
+
+import io
+import unittest
+from lexer import Lexer
+from parser import Parser
+from codegen import CodeGenerator, compute_live_intervals
+
+
+class TestCodeGenerator(unittest.TestCase):
+    
+    def parse_source(self, source):
+        """Helper to parse source code into an AST."""
+        lexer = Lexer(source)
+        tokens = lexer.tokenize()
+        parser = Parser(tokens)
+        return parser.parse()
+    
+    def generate_source(self, source):
+        """Helper to generate assembly for source code."""
+        generator = CodeGenerator(self.parse_source(source))
+        return generator.generate()
+    
+    def instructions(self, asm):
+        """Helper to get emitted instructions (without labels and comments)."""
+        return [line.strip() for line in asm.split("\n")
+                if line.startswith("\t") and not line.strip().startswith(";")]
+    
+    def test_multiplication_uses_shift_and_add(self):
+        """Test that multiplication is a shift-and-add loop, not repeated addition."""
+        source = "function main() { uint32 a = 6; uint32 b = 7; return a * b; }"
+        asm = self.generate_source(source)
+        instructions = self.instructions(asm)
+        
+        self.assertTrue(any(ins.startswith("shl ") for ins in instructions))
+        self.assertTrue(any(ins.startswith("shr ") for ins in instructions))
+        self.assertFalse(any(ins.startswith("sub ") for ins in instructions))
+    
+    def test_division_uses_bounded_loop(self):
+        """Test that division is a 32-iteration shift-subtract loop."""
+        source = "function main() { uint32 a = 100; uint32 b = 7; return a / b; }"
+        asm = self.generate_source(source)
+        instructions = self.instructions(asm)
+        
+        self.assertTrue(any(ins.startswith("mov ") and ins.endswith(", 32") for ins in instructions))
+        self.assertIn("cmovz r:1, r:12, 0", instructions)
+        # sar's shift-type flag overlaps the immediate field of its 3-operand form
+        self.assertFalse(any(ins.startswith("sar ") for ins in instructions))
+    
+    def test_variables_with_disjoint_lifetimes_share_registers(self):
+        """Test that the linear-scan allocator reuses registers of dead variables."""
+        decls = " ".join(f"uint32 v{i} = {i}; uart_write(v{i});" for i in range(30))
+        asm = self.generate_source(f"function main() {{ {decls} }}")
+        
+        self.assertIn("outu r:11", self.instructions(asm))
+        self.assertNotIn("r:12", asm)
+    
+    def test_variable_live_into_loop_spans_whole_loop(self):
+        """Test that a variable read by a loop stays live until the loop ends."""
+        source = """
+        function main() {
+            uint32 i = 0;
+            uint32 s = 0;
+            while (i < 10) {
+                uint32 t = i;
+                i = t + 1;
+            }
+            return s;
+        }
+        """
+        func = self.parse_source(source).functions[0]
+        intervals, reserved = compute_live_intervals(func)
+        
+        self.assertEqual(intervals['i'][1], intervals['t'][1])
+        self.assertLess(intervals['s'][0], intervals['t'][0])
+        self.assertGreater(intervals['s'][1], intervals['t'][1])
+        self.assertEqual(reserved, set())
+
+    
+    def test_constant_expression_folded(self):
+        """Test that expressions of literals are computed at compile time."""
+        asm = self.generate_source("function main() { return (3 + 4) * 2 - -1; }")
+        instructions = self.instructions(asm)
+        
+        self.assertTrue(any(ins.startswith("mov ") and ins.endswith(", 15") for ins in instructions))
+        self.assertNotIn("mul_loop", asm)
+    
+    def test_wide_constants_fit_mov_immediate(self):
+        """Test that folded values of 2^20 and more are built without a wide mov immediate."""
+        asm = self.generate_source("function main() { uint32 x = 0 - 5; uint32 y = 1 << 20; uart_write(x); return y; }")
+        instructions = self.instructions(asm)
+        
+        self.assertIn("mov r:1, 4", instructions)
+        self.assertIn("not r:11, r:1", instructions)
+        self.assertIn("mov r:1, 256", instructions)
+        self.assertTrue(any(ins.startswith("shl ") and ins.endswith(", r:1, 12") for ins in instructions))
+        immediates = [ins.split(", ")[1] for ins in instructions if ins.startswith("mov ")]
+        self.assertTrue(all(int(value) < 1 << 20 for value in immediates if value.isdigit()))
+    
+    def test_modulo_uses_bounded_loop(self):
+        """Test that modulo shares the 32-iteration divider with division."""
+        asm = self.generate_source("function main() { uint32 a = 100; uint32 b = 7; return a % b; }")
+        instructions = self.instructions(asm)
+
+        self.assertTrue(any(ins.startswith("mov ") and ins.endswith(", 32") for ins in instructions))
+        self.assertIn("mod_loop_", asm)
+        self.assertIn("cmovz r:1, r:12, 0", instructions)
+
+    def test_modulo_by_power_of_two_uses_mask(self):
+        """Test that x % 2^k is a single and."""
+        asm = self.generate_source("function main() { uint32 a = 100; uart_write(a % 16); return a; }")
+
+        self.assertIn("and r:1, r:11, 15", self.instructions(asm))
+        self.assertNotIn("mod_loop", asm)
+
+    def test_constant_divisor_skips_zero_check(self):
+        """Test that a constant divisor needs no division-by-zero check and x / 0 is 0."""
+        asm = self.generate_source("function main() { uint32 a = 100; return a / 10 + a % 0; }")
+
+        self.assertIn("div_loop_", asm)
+        self.assertFalse(any(ins.startswith("cmovz r:1,") for ins in self.instructions(asm)))
+        self.assertNotIn("mod_", asm)
+
+    def test_nonzero_divisor_skips_zero_fixup(self):
+        """Test that a divisor or-ed with a constant needs no division-by-zero fixup."""
+        asm = self.generate_source("function main() { uint32 a = 100; uint32 b = 6; return a / (b | 1); }")
+
+        self.assertIn("div_loop_", asm)
+        self.assertFalse(any(ins.startswith("cmovz r:1,") for ins in self.instructions(asm)))
+
+    def test_multiply_by_power_of_two_uses_shift(self):
+        """Test that x * 2^k and x / 2^k become single shifts."""
+        asm = self.generate_source("function main() { uint32 a = 5; return a * 8 + a / 4; }")
+        instructions = self.instructions(asm)
+        
+        self.assertIn("shl r:1, r:11, 3", instructions)
+        self.assertIn("shr r:2, r:11, 2", instructions)
+        self.assertNotIn("mul_loop", asm)
+        self.assertNotIn("div_loop", asm)
+
+    def test_simple_if_else_assignment_is_branchless(self):
+        """Test that if-else assigning one variable becomes mov + cmovz."""
+        source = "function main() { uint32 x = 3; uint32 y; if (x) y = x + 1; else y = 7; return y; }"
+        asm = self.generate_source(source)
+        instructions = self.instructions(asm)
+
+        self.assertTrue(any(ins.startswith("cmovz r:12, r:11, ") for ins in instructions))
+        self.assertFalse(any("r:31" in ins for ins in instructions))
+        self.assertNotIn("else_", asm)
+
+    def test_double_negation_and_logical_not(self):
+        """Test that --x emits nothing and !x is cmpe with 0 plus a mask."""
+        asm = self.generate_source("function main() { uint32 b = 5; uart_write(- -b); uart_write(!b); return 0; }")
+        instructions = self.instructions(asm)
+
+        self.assertIn("outu r:11", instructions)
+        self.assertFalse(any(ins.startswith("sub ") for ins in instructions))
+        self.assertIn("cmpe r:1, r:11, 0", instructions)
+        self.assertIn("and r:1, r:1, 1", instructions)
+
+    def test_small_constants_are_immediates(self):
+        """Test that 0/1 in increments, loops and comparisons are not loaded into registers."""
+        source = "function main() { uint32 i = 0; for (i = 0; i < 5; i++) { uart_write(i >= 2); } return 0; }"
+        instructions = self.instructions(self.generate_source(source))
+
+        self.assertIn("add r:11, r:11, 1", instructions)
+        self.assertFalse(any(ins.startswith("mov r:") and ins.endswith(", 1") for ins in instructions))
+
+    def test_comparison_converts_mask_without_temporaries(self):
+        """Test that comparisons turn the -1/0 mask into 1/0 with one instruction."""
+        asm = self.generate_source("function main() { uint32 a = 1; uint32 b = 2; uart_write(a == b); uart_write(a <= b); return 0; }")
+        instructions = self.instructions(asm)
+
+        self.assertIn("cmpe r:1, r:11, r:12", instructions)
+        self.assertIn("and r:1, r:1, 1", instructions)
+        self.assertIn("cmpa r:1, r:11, r:12", instructions)
+        self.assertIn("add r:1, r:1, 1", instructions)
+        self.assertFalse(any(ins.startswith("cmov") for ins in instructions))
+
+    def test_result_reuses_operand_register(self):
+        """Test that a simple operator writes its result over a dead operand temporary."""
+        asm = self.generate_source("function main() { uint32 a = 1; uint32 b = 2; uart_write((a + b) + (a - b)); return 0; }")
+        instructions = self.instructions(asm)
+
+        self.assertIn("add r:1, r:1, r:2", instructions)
+        self.assertNotIn("r:3", asm)
+
+    def test_logical_operators_are_branchless(self):
+        """Test that && and || are computed without jumps."""
+        asm = self.generate_source("function main() { uint32 a = 1; uint32 b = 0; uart_write(a && b); uart_write(a || b); return 0; }")
+        instructions = self.instructions(asm)
+
+        self.assertFalse(any("r:31" in ins for ins in instructions))
+        self.assertIn("or r:1, r:11, r:12", instructions)
+
+    def test_arguments_passed_in_registers(self):
+        """Test that the first arguments go in r:1, r:2, ... and only the rest use the stack."""
+        source = """
+        function f(uint32 a, uint32 b, uint32 c, uint32 d, uint32 e, uint32 g) { return a + g; }
+        function main() { uint32 x = 1; uint32 y = 2; return f(y, x, 3, 4, 5, 6); }
+        """
+        asm = self.generate_source(source)
+        main_instructions = self.instructions(asm[asm.index("main:"):])
+
+        self.assertIn("mov r:1, r:12", main_instructions)
+        self.assertIn("mov r:2, r:11", main_instructions)
+        self.assertEqual(sum(ins.startswith("lds [r:30]") for ins in main_instructions), 2)
+        self.assertIn("add r:30, r:30, 1", main_instructions)
+
+    def test_argument_saved_across_nested_call(self):
+        """Test that an evaluated argument is pushed before a later argument's call and popped after it."""
+        source = """
+        function g(uint32 v) { return v * 2; }
+        function f(uint32 p, uint32 q) { return p * 100 + q; }
+        function main() { return f(3 + 1, g(5)); }
+        """
+        asm = self.generate_source(source)
+        main_instructions = self.instructions(asm[asm.index("main:"):asm.index("func_g:")])
+        push = main_instructions.index("lds [r:30], r:1")
+        call_g = main_instructions.index("mov r:31, func_g addr")
+        pop = next(i for i, ins in enumerate(main_instructions) if ins.startswith("lds r:") and ins.endswith(", [r:30]"))
+        
+        self.assertEqual(main_instructions[push - 2:push], ["mov r:1, 4", "sub r:30, r:30, 1"])
+        self.assertLess(push, call_g)
+        self.assertLess(call_g, pop)
+    
+    def test_adding_negation_is_subtraction(self):
+        """Test that a + -b and a - -b need no negation."""
+        asm = self.generate_source("function main() { uint32 a = 1; uint32 b = 2; uart_write(a + -b); uart_write(a - -b); return 0; }")
+        instructions = self.instructions(asm)
+
+        self.assertIn("sub r:1, r:11, r:12", instructions)
+        self.assertIn("add r:1, r:11, r:12", instructions)
+        self.assertEqual(sum(ins.startswith("sub ") for ins in instructions), 1)
+
+    def test_not_of_comparison_uses_complement(self):
+        """Test that !(a < b) is generated as a >= b."""
+        asm = self.generate_source("function main() { uint32 a = 1; uint32 b = 2; uart_write(!(a < b)); return a + b; }")
+        instructions = self.instructions(asm)
+
+        self.assertIn("cmpb r:1, r:11, r:12", instructions)
+        self.assertIn("add r:1, r:1, 1", instructions)
+        self.assertFalse(any(ins.startswith("cmpe ") for ins in instructions))
+
+    def test_comparison_condition_jumps_on_mask(self):
+        """Test that loop and if conditions jump on the compare mask without converting it."""
+        source = "function main() { uint32 i = 0; while (i < 5) { i++; } if (i >= 3) { uart_write(i); } return 0; }"
+        instructions = self.instructions(self.generate_source(source))
+
+        self.assertIn("cmpb r:1, r:11, 5", instructions)
+        self.assertTrue(any(ins.startswith("cmovz r:31, r:1, while_end_") for ins in instructions))
+        self.assertIn("cmpb r:1, r:11, 3", instructions)
+        self.assertTrue(any(ins.startswith("cmovnz r:31, r:1, endif_") for ins in instructions))
+        self.assertFalse(any(ins.startswith(("and r:1, r:1, 1", "add r:1, r:1, 1")) for ins in instructions))
+    
+    def test_array_address_loaded_once_per_function(self):
+        """Test that an array's address is loaded at function entry and reused by every access."""
+        source = "uint32 t[4]; function main() { uint32 i; for (i = 0; i < 4; i++) { t[i] = i; uart_write(t[i]); } return t[1]; }"
+        instructions = self.instructions(self.generate_source(source))
+
+        self.assertEqual(instructions.count("mov r:25, array_t addr"), 1)
+        self.assertIn("add r:1, r:25, r:11", instructions)
+    
+    def test_array_address_reloaded_after_call(self):
+        """Test that an array base register is reloaded when a call returns."""
+        source = "uint32 t[4]; function f() { return 1; } function main() { t[0] = f(); return t[0]; }"
+        asm = self.generate_source(source)
+        main_instructions = self.instructions(asm[asm.index("main:"):asm.index("func_f:")])
+
+        self.assertEqual(main_instructions.count("mov r:25, array_t addr"), 2)
+    
+    def test_constant_index_needs_no_index_register(self):
+        """Test that arr[0] uses the base address directly and arr[N] an immediate offset."""
+        source = "uint32 t[4]; function main() { t[0] = 5; t[3] = t[0]; return t[3]; }"
+        instructions = self.instructions(self.generate_source(source))
+
+        self.assertIn("lds [r:25], r:1", instructions)
+        self.assertIn("lds r:2, [r:25]", instructions)
+        self.assertIn("add r:1, r:25, 3", instructions)
+    
+    def test_zero_initialized_array_is_one_data_line(self):
+        """Test that runs of equal array elements use 'times N dd V'."""
+        asm = self.generate_source("uint32 buf[1000]; uint32 t[6] = {7, 7, 7, 1}; function main() { return buf[0] + t[0]; }")
+        
+        self.assertIn("\ttimes 1000 dd 0", asm)
+        self.assertIn("\ttimes 3 dd 7\n\tdd 1\n\ttimes 2 dd 0", asm)
+        self.assertNotIn("\tdd 0", asm)
+    
+    def test_array_initializer_values_share_dd_lines(self):
+        """Test that distinct initializer values are packed 16 to a dd line."""
+        values = ", ".join(str(i) for i in range(1, 21))
+        asm = self.generate_source(f"uint32 t[22] = {{{values}}}; function main() {{ return t[0]; }}")
+        
+        self.assertIn("\tdd " + ", ".join(str(i) for i in range(1, 17)) + "\n\tdd 17, 18, 19, 20\n\ttimes 2 dd 0", asm)
+
+    
+    def test_generate_writes_to_file_object(self):
+        """Test that generate(out=...) writes the same lines it would return."""
+        source = "uint32 t[3] = {1, 2, 3}; function main() { return t[2]; }"
+        out = io.StringIO()
+        
+        self.assertIsNone(CodeGenerator(self.parse_source(source)).generate(out=out))
+        self.assertEqual(out.getvalue(), self.generate_source(source) + "\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
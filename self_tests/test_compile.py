@@ -0,0 +1,166 @@
+"""
+Unit tests for the compiler driver (compile.py).
+"""
+
+import unittest
+import io
+import os
+import tempfile
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+import compile as compiler
+import pipeline
+
+
+class TestCompileWithFasm(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a temporary .asm file."""
+        self.test_dir = tempfile.mkdtemp()
+        self.asm_file = os.path.join(self.test_dir, "prog.asm")
+        self.bin_file = os.path.join(self.test_dir, "prog.bin")
+        self.write_asm("\tmov r:0, 1\n\thlt\n")
+    
+    def tearDown(self):
+        """Clean up temporary directory."""
+        shutil.rmtree(self.test_dir)
+    
+    def write_asm(self, content):
+        """Helper to (re)write the test .asm file."""
+        with open(self.asm_file, 'w') as f:
+            f.write(content)
+    
+    def fake_fasm(self, args, **kwargs):
+        """Stand-in for the FASM run: writes the .bin next to the .asm."""
+        with open(os.path.join(kwargs["cwd"], "prog.bin"), 'wb') as f:
+            f.write(b"\0\0\0\0")
+        return subprocess.CompletedProcess(args, 0, "", "")
+    
+    def run_fasm(self):
+        """Helper to run compile_with_fasm; returns whether FASM was started."""
+        with mock.patch("compile.subprocess.run", side_effect=self.fake_fasm) as run, \
+                redirect_stdout(io.StringIO()):
+            compiler.compile_with_fasm(self.asm_file)
+        return run.called
+    
+    def test_unchanged_asm_skips_fasm(self):
+        """Test that FASM is not run again for the same .asm content."""
+        self.assertTrue(self.run_fasm())
+        self.write_asm("\tmov r:0, 1\n\thlt\n")
+        self.assertFalse(self.run_fasm())
+    
+    def test_changed_asm_runs_fasm(self):
+        """Test that different .asm content is assembled again."""
+        self.assertTrue(self.run_fasm())
+        self.write_asm("\tmov r:0, 2\n\thlt\n")
+        self.assertTrue(self.run_fasm())
+    
+    def test_missing_or_modified_binary_runs_fasm(self):
+        """Test that a deleted or rewritten .bin is rebuilt."""
+        self.assertTrue(self.run_fasm())
+        os.remove(self.bin_file)
+        self.assertTrue(self.run_fasm())
+        with open(self.bin_file, 'ab') as f:
+            f.write(b"\1")
+        self.assertTrue(self.run_fasm())
+
+
+
+class TestCompileFile(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a temporary directory with an existing .asm file."""
+        self.test_dir = tempfile.mkdtemp()
+        self.source_file = os.path.join(self.test_dir, "prog.sc")
+        self.asm_file = os.path.join(self.test_dir, "prog.asm")
+        with open(self.asm_file, 'w') as f:
+            f.write("; previous build\n")
+    
+    def tearDown(self):
+        """Clean up temporary directory."""
+        shutil.rmtree(self.test_dir)
+    
+    def compile_source(self, source):
+        """Helper to compile source (without the AST cache and FASM); returns the exit code."""
+        with open(self.source_file, 'w') as f:
+            f.write(source)
+        with mock.patch("compile.build_ast_cached", pipeline.build_ast), \
+                mock.patch("compile.compile_with_fasm"), \
+                redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            try:
+                compiler.compile_file(self.source_file)
+            except SystemExit as e:
+                return e.code
+        return 0
+    
+    def test_code_generation_error_keeps_previous_asm(self):
+        """Test that a failed code generation leaves the old .asm untouched."""
+        self.assertEqual(self.compile_source("function main() { set_bit(1, 2); return 0; }"), 1)
+        
+        with open(self.asm_file) as f:
+            self.assertEqual(f.read(), "; previous build\n")
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["prog.asm", "prog.sc"])
+    
+    def test_successful_compile_replaces_asm(self):
+        """Test that generated assembly replaces the old .asm."""
+        self.assertEqual(self.compile_source("function main() { return 42; }"), 0)
+        
+        with open(self.asm_file) as f:
+            self.assertIn("main:", f.read())
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["prog.asm", "prog.sc"])
+
+
+class TestBatch(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a temporary directory for the list file."""
+        self.test_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up temporary directory."""
+        shutil.rmtree(self.test_dir)
+    
+    def fake_compile(self, source_file, output_file=None):
+        """Stand-in for compile_file failing the ways the real one can."""
+        if source_file == "exit.sc":
+            print("Syntax error: ...")
+            raise SystemExit(1)
+        if source_file == "deep.sc":
+            raise RecursionError("maximum recursion depth exceeded")
+        return source_file.replace(".sc", ".asm")
+    
+    def test_read_batch_file_skips_blank_and_comment_lines(self):
+        """Test that the list file yields one path per non-empty, non-comment line."""
+        list_file = os.path.join(self.test_dir, "sources.txt")
+        with open(list_file, 'w') as f:
+            f.write("a.sc\n\n# disabled.sc\n  dir/b.sc  \n")
+        
+        self.assertEqual(compiler.read_batch_file(list_file), ["a.sc", "dir/b.sc"])
+    
+    def test_unexpected_error_fails_only_its_file(self):
+        """Test that an exception from compile_file is reported, not raised."""
+        output = io.StringIO()
+        with mock.patch("compile.compile_file", side_effect=self.fake_compile), redirect_stdout(output):
+            self.assertFalse(compiler._compile_one("deep.sc"))
+            self.assertFalse(compiler._compile_one("exit.sc"))
+            self.assertTrue(compiler._compile_one("ok.sc"))
+        self.assertIn("Error compiling deep.sc: RecursionError", output.getvalue())
+    
+    def test_batch_continues_after_failures(self):
+        """Test that every file is compiled and the failed ones are listed."""
+        output = io.StringIO()
+        # Threads instead of processes, so the patched compile_file is used
+        with mock.patch("compile.ProcessPoolExecutor", ThreadPoolExecutor), \
+                mock.patch("compile.compile_file", side_effect=self.fake_compile), redirect_stdout(output):
+            failed = compiler.compile_batch(["ok.sc", "deep.sc", "exit.sc", "ok2.sc"])
+        
+        self.assertEqual(failed, 2)
+        self.assertIn("Batch: 2 of 4 files compiled.", output.getvalue())
+        self.assertIn("  Failed: deep.sc\n  Failed: exit.sc", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
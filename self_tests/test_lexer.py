@@ -270,6 +270,16 @@ class TestLexer(unittest.TestCase):
         self.assertEqual(non_eof[0].type, TokenType.ASM)
         self.assertEqual(non_eof[1].type, TokenType.ASM_BLOCK)
         self.assertIn("inner { label }", non_eof[1].value)
+    
+    def test_repeated_identifiers_share_one_string(self):
+        """Test that every occurrence of a name reuses the same string object."""
+        source = "counter = counter + other_counter; counter++;"
+        lexer = Lexer(source)
+        tokens = lexer.tokenize()
+        
+        names = [t.value for t in tokens if t.value == "counter"]
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(name is names[0] for name in names))
 
 
 if __name__ == '__main__':
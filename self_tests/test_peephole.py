@@ -0,0 +1,106 @@
+"""
+Unit tests for the peephole optimizer.
+"""
+
+import unittest
+from peephole import peephole
+
+
+class TestPeephole(unittest.TestCase):
+    
+    def optimize(self, *instructions):
+        """Helper to run the optimizer on tab-indented instructions."""
+        return [line.strip() for line in peephole([f"\t{ins}" for ins in instructions])]
+    
+    def test_self_move_removed(self):
+        """Test that mov Rx, Rx is removed."""
+        self.assertEqual(self.optimize("mov r:11, r:11", "outu r:11"), ["outu r:11"])
+    
+    def test_add_zero_removed(self):
+        """Test that add Rd, Rd, 0 is removed."""
+        self.assertEqual(self.optimize("add r:11, r:11, 0", "outu r:11"), ["outu r:11"])
+    
+    def test_constant_folded_into_immediate(self):
+        """Test that a constant loaded only for one operation becomes an immediate."""
+        result = self.optimize("mov r:1, 1", "add r:2, r:11, r:1", "mov r:11, r:2", "mov r:1, 0", "mov r:2, 0", "outu r:11")
+        self.assertEqual(result[0], "add r:11, r:11, 1")
+    
+    def test_constant_folded_into_commutative_operand(self):
+        """Test that the immediate is moved to the third operand when allowed."""
+        result = self.optimize("mov r:1, 5", "and r:11, r:1, r:12", "mov r:1, 0", "outu r:1")
+        self.assertEqual(result[0], "and r:11, r:12, 5")
+        
+        result = self.optimize("mov r:1, 5", "cmpa r:11, r:1, r:12", "mov r:1, 0", "outu r:1")
+        self.assertEqual(result[0], "cmpb r:11, r:12, 5")
+    
+    def test_constant_not_folded_into_flagged_shifts(self):
+        """Test that sar/sal/ror/rol keep a register operand: their flag bit overlaps the immediate field."""
+        for op in ("sar", "sal", "ror", "rol"):
+            result = self.optimize("mov r:1, 3", f"{op} r:2, r:11, r:1", "mov r:1, 0", "outu r:2")
+            self.assertEqual(result[:2], ["mov r:1, 3", f"{op} r:2, r:11, r:1"])
+    
+    def test_constant_kept_when_still_live(self):
+        """Test that a constant register read later is not folded away."""
+        result = self.optimize("mov r:1, 5", "add r:2, r:11, r:1", "outu r:1", "outu r:2")
+        self.assertEqual(result, ["mov r:1, 5", "add r:2, r:11, r:1", "outu r:1", "outu r:2"])
+    
+    def test_subtraction_operands_not_swapped(self):
+        """Test that a constant first operand of a non-commutative op stays in a register."""
+        result = self.optimize("mov r:1, 0", "sub r:2, r:1, r:11", "mov r:1, 0", "outu r:2")
+        self.assertIn("sub r:2, r:1, r:11", result)
+    
+    def test_copy_propagated_into_next_instruction(self):
+        """Test that a register copied only for the next instruction is read directly."""
+        self.assertEqual(self.optimize("mov r:1, r:0", "outu r:1", "mov r:1, 0", "outu r:1"),
+                         ["outu r:0", "mov r:1, 0", "outu r:1"])
+        result = self.optimize("mov r:1, r:0", "cmovz r:1, r:2, r:3", "outu r:1")
+        self.assertEqual(result[0], "mov r:1, r:0")
+    
+    def test_only_result_register_live_at_halt(self):
+        """Test that writes other than to r:0 are dropped right before hlt."""
+        self.assertEqual(self.optimize("mov r:1, 15", "mov r:0, r:1", "mov r:2, 3", "hlt"),
+                         ["mov r:0, 15", "hlt"])
+    
+    def test_jump_to_next_label_removed(self):
+        """Test that a jump to the label directly after it is removed."""
+        lines = ["\tmov r:31, end_1 addr", "\t; comment", "end_1:", "\tcmovz r:31, r:1, next_2 addr", "next_2:", "\toutu r:1"]
+        self.assertEqual(peephole(lines), ["\t; comment", "end_1:", "next_2:", "\toutu r:1"])
+    
+    def test_unused_labels_dropped_on_request(self):
+        """Test that labels nobody jumps to are removed and their blocks merge."""
+        lines = ["\tmov r:31, loop_1 addr", "loop_1:", "\tmov r:1, 5", "end_2:", "\tadd r:2, r:11, r:1",
+                 "\tmov r:1, 0", "\tcmovz r:31, r:2, loop_1 addr", "\toutu r:2"]
+        self.assertEqual(peephole(lines, drop_unused_labels=True),
+                         ["loop_1:", "\tadd r:2, r:11, 5", "\tmov r:1, 0", "\tcmovz r:31, r:2, loop_1 addr", "\toutu r:2"])
+    
+    def test_copy_feeding_conditional_jump_kept(self):
+        """Test that a copy read by a conditional jump survives: the jump target may read it."""
+        lines = ["\tsub r:1, r:11, 5", "\tmov r:12, r:1", "\tcmovz r:31, r:12, endif_1 addr",
+                 "\tmov r:12, 9", "endif_1:", "\tadd r:0, r:12, 100", "\thlt"]
+        self.assertEqual(peephole(lines), lines)
+    
+    def test_labels_are_barriers(self):
+        """Test that rewrites do not cross labels."""
+        lines = ["\tmov r:1, 5", "loop:", "\tadd r:2, r:11, r:1", "\tmov r:1, 0", "\toutu r:2"]
+        self.assertEqual(peephole(lines)[:3], lines[:3])
+
+    
+    def test_repeated_constant_load_removed(self):
+        """Test that reloading a constant a register still holds is removed."""
+        result = self.optimize("mov r:1, 100000", "add r:11, r:11, r:1",
+                               "mov r:1, 100000", "add r:12, r:12, r:1", "outu r:1")
+        self.assertEqual(result, ["mov r:1, 100000", "add r:11, r:11, r:1", "add r:12, r:12, r:1", "outu r:1"])
+    
+    def test_constant_forgotten_after_label(self):
+        """Test that known register values do not survive a label."""
+        lines = ["\tmov r:1, 100000", "\toutu r:1", "next:", "\tmov r:1, 100000", "\toutu r:1"]
+        self.assertEqual(peephole(lines), lines)
+    
+    def test_jumps_never_removed_as_redundant_loads(self):
+        """Test that repeated jumps to the same label are kept."""
+        lines = ["\tmov r:31, loop addr", "\tmov r:31, loop addr"]
+        self.assertEqual(peephole(lines), lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Unit tests for the front-end pipeline and its AST cache.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+from unittest import mock
+import pipeline
+from parser import Program
+
+
+class TestPipeline(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a temporary source file and cache directory."""
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+        self.source_file = os.path.join(self.test_dir, "main.sc")
+        self.write_source("function main() { return 42; }")
+    
+    def tearDown(self):
+        """Clean up temporary directory."""
+        shutil.rmtree(self.test_dir)
+    
+    def write_source(self, content, filename="main.sc"):
+        """Helper to (re)write a test source file."""
+        with open(os.path.join(self.test_dir, filename), 'w') as f:
+            f.write(content)
+    
+    def cached_asts(self):
+        """Helper to count the AST entries in the cache directory."""
+        return len([name for name in os.listdir(self.cache_dir) if name.endswith(".pkl")])
+    
+    def test_cached_ast_reused_for_unchanged_source(self):
+        """Test that the second build of unchanged source does not parse again."""
+        first = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        self.assertIsInstance(first, Program)
+        self.assertEqual(self.cached_asts(), 1)
+        
+        with mock.patch.object(pipeline, 'parse_source') as parse_source:
+            second = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        parse_source.assert_not_called()
+        self.assertEqual(second.functions[0].name, "main")
+    
+    def test_changed_source_is_parsed_again(self):
+        """Test that an edited source gets a new cache entry."""
+        pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        self.write_source("function main() { return 7; }")
+        ast = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        
+        self.assertEqual(ast.functions[0].body.statements[0].value.value, 7)
+        self.assertEqual(self.cached_asts(), 2)
+    
+    def test_unchanged_files_skip_preprocessing(self):
+        """Test that matching file stamps load the AST without preprocessing."""
+        pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        with mock.patch.object(pipeline, 'preprocess_source') as preprocess_source:
+            ast = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        preprocess_source.assert_not_called()
+        self.assertEqual(ast.functions[0].name, "main")
+    
+    def test_edited_include_is_parsed_again(self):
+        """Test that a change to an included file invalidates the cached AST."""
+        self.write_source("#define VALUE 1", "values.h")
+        self.write_source('#include "values.h"\nfunction main() { return VALUE; }')
+        pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        self.write_source("#define VALUE 12", "values.h")
+        ast = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        
+        self.assertEqual(ast.functions[0].body.statements[0].value.value, 12)
+    
+    def test_new_file_shadowing_include_is_parsed_again(self):
+        """Test that a file created earlier on the include search path replaces the cached AST."""
+        os.makedirs(os.path.join(self.test_dir, "sub"))
+        self.write_source("#define VALUE 1", "y.sc")
+        self.write_source('#include "y.sc"', os.path.join("sub", "x.sc"))
+        self.write_source('#include "sub/x.sc"\nfunction main() { return VALUE; }')
+        old_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            pipeline.build_ast_cached(self.source_file, self.cache_dir)
+            self.write_source("#define VALUE 2", os.path.join("sub", "y.sc"))
+            ast = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        finally:
+            os.chdir(old_cwd)
+        
+        self.assertEqual(ast.functions[0].body.statements[0].value.value, 2)
+    
+    def test_changed_front_end_is_parsed_again(self):
+        """Test that editing the lexer/parser sources invalidates cached ASTs."""
+        pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        with mock.patch.object(pipeline, 'FRONT_END_FINGERPRINT', "edited parser"), \
+                mock.patch.object(pipeline, 'parse_source', wraps=pipeline.parse_source) as parse_source:
+            ast = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        parse_source.assert_called_once()
+        self.assertEqual(ast.functions[0].name, "main")
+        self.assertEqual(self.cached_asts(), 2)
+    
+    def test_unusable_cache_entry_is_ignored(self):
+        """Test that a corrupt cache entry falls back to parsing."""
+        key = pipeline.ast_cache_key(pipeline.preprocess_source(self.source_file))
+        os.makedirs(self.cache_dir)
+        with open(os.path.join(self.cache_dir, f"{key}.pkl"), 'wb') as f:
+            f.write(b"not a pickle")
+        
+        ast = pipeline.build_ast_cached(self.source_file, self.cache_dir)
+        self.assertEqual(ast.functions[0].name, "main")
+
+
+if __name__ == '__main__':
+    unittest.main()